@@ -0,0 +1,2 @@
+"""Benchmarks for taghtml with synthetic competitions, run them with `python -m benchmarks.run`.
+"""
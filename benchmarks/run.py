@@ -0,0 +1,180 @@
+import os
+import sys
+import gc
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import tracemalloc
+from pathlib import Path
+
+__PACKAGE__ = Path(__file__).absolute().parent.parent / "taghtml"
+__TEMPLATES__ = ["basic.jinja", "fancy.jinja"]
+__SIZES__ = [100, 1000, 5000]
+__REGRESSION__ = 1.2 # a stage counts as a regression if it got this much slower than the compared run
+
+
+def measure(stage, reset=None, repeat=1) -> dict:
+    # the best time out of repeat runs, then one more run under tracemalloc for the peak memory
+    # tracemalloc only sees python allocations, memory polars allocates in rust isn't included
+    seconds = []
+    for _ in range(repeat):
+        if reset:
+            reset()
+        gc.collect()
+        start = time.perf_counter()
+        stage()
+        seconds.append(time.perf_counter() - start)
+    if reset:
+        reset()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        stage()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"seconds": round(min(seconds), 6), "peak_bytes": peak}
+
+
+def run(sizes, templates, export_rows, repeat, progress=None) -> list[dict]:
+    # taghtml is imported here because TAGHTML_DATA has to be set before datahandler is loaded
+    from taghtml import datahandler, jinjarenderer
+    from taghtml.datahandler import CompetitorData, build_comp_counts, fetch_wcif
+    from taghtml.jinjarenderer import JinjaRenderer, make_qrs
+    from .synthetic import write_export, generate_wcif
+    from .standin import WCAStandIn
+
+    results = []
+
+    def record(size, template, stage, reset=None, stage_repeat=repeat, fn=None):
+        result = measure(fn, reset, stage_repeat)
+        results.append({"size": size, "template": template, "stage": stage, **result})
+        if progress:
+            progress(results[-1])
+
+    task_start = time.perf_counter()
+    write_export(datahandler._DATA_, persons=max(export_rows // 20, 1), results=export_rows)
+    if progress:
+        progress({"size": None, "template": None, "stage": "write_export", "seconds": round(time.perf_counter() - task_start, 6), "peak_bytes": None})
+    record(None, None, "build_comp_counts", fn=build_comp_counts)
+
+    def clear_wcif():
+        shutil.rmtree(datahandler._WCIF_, ignore_errors=True)
+
+    def clear_qrs():
+        shutil.rmtree(jinjarenderer.__QR_CACHE__, ignore_errors=True)
+
+    with WCAStandIn() as standin:
+        for size in sizes:
+            comp_id = f"Bench{size}"
+            standin.add(comp_id, generate_wcif(comp_id, persons=size, export_persons=max(export_rows // 20, 1), seed=size))
+            record(size, None, "fetch_wcif", clear_wcif, fn=lambda: fetch_wcif(comp_id))
+            wcif = fetch_wcif(comp_id)
+            # the wcif is passed in so only prepare_data is measured and not the cache lookup
+            record(size, None, "prepare_data", fn=lambda: CompetitorData(comp_id, wcif=wcif))
+            comp_data = CompetitorData(comp_id, wcif=wcif)
+
+            qr_renderer = JinjaRenderer(8.5, 5.5, __PACKAGE__ / "templates" / __TEMPLATES__[0], **emoji_paths())
+            qr_renderer.comp_id = comp_id
+            datas = [qr_renderer.qr_data(competitor) for competitor in comp_data]
+            record(size, None, "make_qrs_cold", clear_qrs, fn=lambda: make_qrs(datas))
+            record(size, None, "make_qrs_warm", fn=lambda: make_qrs(datas))
+
+            for template in templates:
+                template_path = __PACKAGE__ / "templates" / template
+                renderers = []
+
+                def new_renderer():
+                    renderers[:] = [JinjaRenderer(8.5, 5.5, template_path, **emoji_paths())]
+
+                # a new renderer for every run, otherwise setup would reuse the render dicts of the previous one
+                record(size, template, "setup", new_renderer, fn=lambda: renderers[0].setup(comp_data))
+                r = JinjaRenderer(8.5, 5.5, template_path, **emoji_paths())
+                r.setup(comp_data)
+                record(size, template, "render", fn=r.render)
+                record(size, template, "render_stream", fn=lambda: sum(len(chunk) for chunk in r.render_stream()))
+    return results
+
+
+def emoji_paths() -> dict:
+    return dict(
+        exp_emoji_path=__PACKAGE__ / "jsons" / "experience_emoji.json",
+        people_emoji_path=__PACKAGE__ / "jsons" / "people_emoji.json",
+        cid_modulo_emoji_path=__PACKAGE__ / "jsons" / "cid_modulo_emoji.json",
+    )
+
+
+def result_key(result: dict):
+    return (result["size"], result["template"], result["stage"])
+
+
+def compare(results: list[dict], previous: list[dict]) -> dict:
+    # ratio of the new time to the old one for every stage both runs have
+    old = {result_key(result): result for result in previous}
+    return {key: result["seconds"] / old[key]["seconds"] for result in results if (key := result_key(result)) in old and old[key]["seconds"]}
+
+
+def print_table(results: list[dict], ratios: dict):
+    from rich.console import Console
+    from rich.table import Table
+    table = Table("Size", "Template", "Stage", "Seconds", "Peak MiB", *(["vs. previous"] if ratios else []))
+    for result in results:
+        row = [
+            str(result["size"] or ""), result["template"] or "", result["stage"],
+            f"{result['seconds']:.4f}", f"{result['peak_bytes'] / (1 << 20):.1f}",
+        ]
+        if ratios:
+            ratio = ratios.get(result_key(result))
+            row.append("" if ratio is None else f"[{'red' if ratio > __REGRESSION__ else 'green'}]{ratio:.2f}x")
+        table.add_row(*row)
+    Console().print(table)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run", description="Time every stage of taghtml on synthetic competitions.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=__SIZES__, help="Number of competitors of the synthetic competitions.")
+    parser.add_argument("--templates", nargs="+", default=__TEMPLATES__, help="Bundled templates to render.")
+    parser.add_argument("--export-rows", type=int, default=2_000_000, help="Rows of the synthetic WCA_export_Results.tsv.")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per stage, the fastest one is reported.")
+    parser.add_argument("--out", type=Path, help="Write the results as json to this file.")
+    parser.add_argument("--compare", type=Path, help="Results json of an earlier run to compare against.")
+    parser.add_argument("--data", type=Path, help="Folder for the synthetic export and caches, a temporary folder by default.")
+    args = parser.parse_args(argv)
+
+    data = args.data or Path(tempfile.mkdtemp(prefix="taghtml-bench-"))
+    os.environ["TAGHTML_DATA"] = str(data)
+    try:
+        results = run(args.sizes, args.templates, args.export_rows, args.repeat, progress=lambda result: print(
+            f"{result['size'] or '':>6} {result['template'] or '':<12} {result['stage']:<18} {result['seconds']:.4f}s", file=sys.stderr
+        ))
+    finally:
+        if args.data is None:
+            shutil.rmtree(data, ignore_errors=True)
+
+    from taghtml import __version__
+    report = {
+        "version": __version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "export_rows": args.export_rows,
+        "repeat": args.repeat,
+        "results": results,
+    }
+    ratios = {}
+    if args.compare:
+        with open(args.compare, encoding="utf8") as file:
+            ratios = compare(results, json.load(file)["results"])
+    print_table(results, ratios)
+    if args.out:
+        with open(args.out, "w", encoding="utf8") as file:
+            json.dump(report, file, indent=2)
+    # a non zero exit code lets scripts catch regressions
+    return 1 if any(ratio > __REGRESSION__ for ratio in ratios.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,62 @@
+import json
+import hashlib
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from taghtml import datahandler
+
+
+class WCAStandIn(ThreadingHTTPServer):
+    # serves /competitions/{id}/wcif/public like the WCA API does, including ETags for revalidation
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=0) -> None:
+        super().__init__((host, port), WCIFHandler)
+        self.wcifs: dict[str, tuple[bytes, str]] = {}
+        self.requests = 0
+
+    def add(self, comp_id: str, wcif: dict):
+        body = json.dumps(wcif).encode("utf-8")
+        self.wcifs[comp_id] = (body, f'"{hashlib.sha256(body).hexdigest()[:16]}"')
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        # everything taghtml fetches goes here until the stand-in is stopped
+        self.previous_api = datahandler._WCA_API_
+        datahandler._WCA_API_ = self.url
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        datahandler._WCA_API_ = self.previous_api
+        self.shutdown()
+        self.server_close()
+
+
+class WCIFHandler(BaseHTTPRequestHandler):
+    server: WCAStandIn
+
+    def do_GET(self):
+        self.server.requests += 1
+        parts = self.path.strip("/").split("/")
+        if len(parts) != 4 or parts[0] != "competitions" or parts[2:] != ["wcif", "public"] or parts[1] not in self.server.wcifs:
+            self.send_error(404)
+            return
+        body, etag = self.server.wcifs[parts[1]]
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
@@ -0,0 +1,138 @@
+import random
+import datetime
+import polars as pl
+from pathlib import Path
+
+EVENTS = ["333", "222", "444", "555", "666", "777", "333bf", "333fm", "333oh", "clock", "minx", "pyram", "skewb", "sq1", "444bf", "555bf", "333mbf"]
+STAFF_CODES = ["staff-judge", "staff-runner", "staff-scrambler", "staff-stagelead", "staff-delegate", "staff-dataentry"]
+__TIME_FORMAT__ = "%Y-%m-%dT%H:%M:%SZ"
+__PACKAGE__ = Path(__file__).absolute().parent.parent / "taghtml"
+
+
+def country_codes() -> list[str]:
+    # every country taghtml has a flag for
+    return sorted(path.stem.upper() for path in (__PACKAGE__ / "graphics" / "flags").glob("*.png"))
+
+
+def write_export(directory: Path, persons=100_000, results=2_000_000, competitions=15_000):
+    # writes WCA_export_Results.tsv and WCA_export_Countries.tsv with the columns of the real export
+    directory.mkdir(parents=True, exist_ok=True)
+    countries = country_codes()
+    pl.DataFrame({
+        "id": [f"Country {iso2}" for iso2 in countries],
+        "name": [f"Country {iso2}" for iso2 in countries],
+        "continentId": ["_Europe"] * len(countries),
+        "iso2": countries,
+    }).write_csv(directory / "WCA_export_Countries.tsv", separator="\t")
+
+    # a multiplicative hash spreads the results over people and competitions without needing numpy
+    row = pl.int_range(results, dtype=pl.Int64)
+    person = (row * 2654435761 + 12345) % persons
+    (
+        pl.select(
+            ("Comp" + ((row * 40503 + person) % competitions).cast(pl.String)).alias("competitionId"),
+            pl.lit("333").alias("eventId"),
+            pl.lit("f").alias("roundTypeId"),
+            (row % 100 + 1).alias("pos"),
+            (row % 3000 + 500).alias("best"),
+            (row % 4000 + 600).alias("average"),
+            ("Person " + person.cast(pl.String)).alias("personName"),
+            pl.format("{}B{}", 2000 + person % 25, person.cast(pl.String).str.zfill(5)).alias("personId"),
+            pl.lit("Country DE").alias("personCountryId"),
+            pl.lit("a").alias("formatId"),
+            *[(row % (1000 + i) + 500).alias(f"value{i}") for i in range(1, 6)],
+            pl.lit(None, dtype=pl.String).alias("regionalSingleRecord"),
+            pl.lit(None, dtype=pl.String).alias("regionalAverageRecord"),
+        )
+        .write_csv(directory / "WCA_export_Results.tsv", separator="\t")
+    )
+
+
+def export_person_id(i: int) -> str:
+    # has to match the personId format of write_export
+    return f"{2000 + i % 25}B{i:05d}"
+
+
+def generate_wcif(
+        comp_id="Bench2025", persons=1000, venues=1, rooms=3, events=EVENTS, rounds=2, groups=None,
+        assignments_per_person=12, newcomer_ratio=0.2, export_persons=100_000, seed=0) -> dict:
+    # a wcif with the structure of the public WCA API, groups default to enough for ~30 competitors each
+    rng = random.Random(seed)
+    groups = groups or max(1, persons // 30)
+    start = datetime.datetime(2025, 9, 26, 8, 0)
+    room_list = [(venue, room) for venue in range(venues) for room in range(rooms)]
+    room_times = {key: start for key in room_list}
+    schedule = {venue: [] for venue in range(venues)}
+    activity_id = 1
+    groups_by_event = {}
+    for r in range(1, rounds + 1):
+        for i, event in enumerate(events):
+            venue, room = room_list[(i + r) % len(room_list)]
+            round_start = room_times[(venue, room)]
+            children = []
+            for g in range(1, groups + 1):
+                group_start = round_start + datetime.timedelta(minutes=10 * (g - 1))
+                children.append({
+                    "id": activity_id + g, "name": f"{event} round {r} group {g}", "activityCode": f"{event}-r{r}-g{g}",
+                    "startTime": group_start.strftime(__TIME_FORMAT__),
+                    "endTime": (group_start + datetime.timedelta(minutes=10)).strftime(__TIME_FORMAT__),
+                    "childActivities": [], "extensions": [],
+                })
+            round_end = round_start + datetime.timedelta(minutes=10 * groups)
+            schedule[venue].append((room, {
+                "id": activity_id, "name": f"{event} round {r}", "activityCode": f"{event}-r{r}",
+                "startTime": round_start.strftime(__TIME_FORMAT__), "endTime": round_end.strftime(__TIME_FORMAT__),
+                "childActivities": children, "extensions": [],
+            }))
+            groups_by_event.setdefault(event, []).extend(child["id"] for child in children if r == 1)
+            room_times[(venue, room)] = round_end
+            activity_id += groups + 1
+    lunch = start + datetime.timedelta(hours=4)
+    schedule[0].append((0, {
+        "id": activity_id, "name": "Lunch", "activityCode": "other-lunch",
+        "startTime": lunch.strftime(__TIME_FORMAT__), "endTime": (lunch + datetime.timedelta(hours=1)).strftime(__TIME_FORMAT__),
+        "childActivities": [], "extensions": [],
+    }))
+
+    countries = country_codes()
+    person_list = []
+    for i in range(1, persons + 1):
+        assignments = []
+        person_events = rng.sample(list(events), min(len(events), max(1, assignments_per_person // 2)))
+        for event in person_events:
+            assignments.append({"activityId": rng.choice(groups_by_event[event]), "assignmentCode": "competitor", "stationNumber": None})
+        while len(assignments) < assignments_per_person:
+            event = rng.choice(person_events)
+            assignments.append({"activityId": rng.choice(groups_by_event[event]), "assignmentCode": rng.choice(STAFF_CODES), "stationNumber": rng.randint(1, 20)})
+        first, last = f"First{i}", f"Last{rng.randint(1, persons)}"
+        person_list.append({
+            "registrantId": i, "name": f"{first} {last}" + (" (名字)" if i % 13 == 0 else ""),
+            "wcaUserId": 100000 + i,
+            "wcaId": None if rng.random() < newcomer_ratio else export_person_id(rng.randrange(export_persons)),
+            "countryIso2": rng.choice(countries), "gender": rng.choice("mfo"), "roles": ["delegate"] if i == 1 else [],
+            "registration": {"wcaRegistrationId": i, "eventIds": person_events, "status": "accepted", "isCompeting": True},
+            "avatar": None, "assignments": assignments,
+            "personalBests": [{"eventId": event, "best": rng.randint(500, 6000), "worldRanking": rng.randint(1, 200000), "continentalRanking": 1, "nationalRanking": 1, "type": "single"} for event in person_events],
+            "extensions": [],
+        })
+    return {
+        "formatVersion": "1.0", "id": comp_id, "name": f"{comp_id} Benchmark", "shortName": comp_id,
+        "persons": person_list,
+        "events": [{"id": event, "rounds": [], "extensions": []} for event in events],
+        "schedule": {
+            "startDate": start.strftime("%Y-%m-%d"), "numberOfDays": 1,
+            "venues": [
+                {
+                    "id": venue + 1, "name": f"Venue {venue + 1}", "latitudeMicrodegrees": 0, "longitudeMicrodegrees": 0,
+                    "countryIso2": "DE", "timezone": "Europe/Berlin", "extensions": [],
+                    "rooms": [
+                        {"id": venue * rooms + room + 1, "name": f"Stage {room + 1}", "color": "#304a96", "extensions": [],
+                         "activities": [activity for activity_room, activity in schedule[venue] if activity_room == room]}
+                        for room in range(rooms)
+                    ],
+                }
+                for venue in range(venues)
+            ],
+        },
+        "competitorLimit": persons, "extensions": [],
+    }
@@ -0,0 +1,152 @@
+import re
+import copy
+import base64
+import hashlib
+import struct
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+__SVG_NS__ = "{http://www.w3.org/2000/svg}"
+__XLINK_HREF__ = "{http://www.w3.org/1999/xlink}href"
+
+
+def png_size(path: Path) -> tuple[int, int]:
+    # width and height are the first two fields of the IHDR chunk right after the signature
+    with open(path, "rb") as file:
+        header = file.read(24)
+    return struct.unpack(">II", header[16:24])
+
+
+def svg_symbol(path: Path, symbol_id: str) -> tuple[str, str]:
+    # turns a standalone svg file into a <symbol>, returns the symbol markup and its viewBox
+    root = ET.parse(path).getroot()
+    view_box = root.get("viewBox")
+    if view_box is None:
+        width = float(re.sub(r"[^0-9.]", "", root.get("width", "100")))
+        height = float(re.sub(r"[^0-9.]", "", root.get("height", "100")))
+        view_box = f"0 0 {width:g} {height:g}"
+
+    def clean(element):
+        # inline svg lives in the html namespace, so editor metadata and namespace prefixes have to go
+        for child in list(element):
+            if not isinstance(child.tag, str) or not child.tag.startswith(__SVG_NS__) or child.tag == f"{__SVG_NS__}metadata":
+                element.remove(child)
+                continue
+            child.tag = child.tag.removeprefix(__SVG_NS__)
+            if __XLINK_HREF__ in child.attrib:
+                child.set("href", child.attrib.pop(__XLINK_HREF__))
+            for key in [key for key in child.attrib if key.startswith("{")]:
+                del child.attrib[key]
+            for key, value in child.attrib.items():
+                # every symbol ends up in the same document, so ids and references to them get a prefix
+                if key == "id":
+                    child.set(key, f"{symbol_id}-{value}")
+                elif key == "href" and value.startswith("#"):
+                    child.set(key, f"#{symbol_id}-{value[1:]}")
+                else:
+                    child.set(key, re.sub(r"url\(#([^)]*)\)", lambda m: f"url(#{symbol_id}-{m.group(1)})", value))
+            clean(child)
+
+    clean(root)
+    body = "".join(ET.tostring(child, encoding="unicode", default_namespace=None) for child in root)
+    return f'<symbol id="{symbol_id}" viewBox="{view_box}">{body}</symbol>', view_box
+
+
+class Assets:
+    # helpers for the templates to reference graphics and stylesheets, either as links or inlined into the document
+    def __init__(self, self_contained=False, root: Path = Path(".")) -> None:
+        self.self_contained = self_contained
+        self.root = root
+        self.events: set[str] = set()
+        self.flags: set[str] = set()
+        self.symbols: dict[str, tuple[str, str]] = {}
+        self.emitted: set[str] = set()
+        self.stamp = None
+
+    def use(self, events, flags) -> "Assets":
+        # the sprite sheet comes before the tags in the document, so everything it needs has to be known up front
+        # every document gets its own copy to keep track of that, only the symbols are shared
+        assets = copy.copy(self)
+        assets.events = set(events)
+        assets.flags = {iso2.lower() for iso2 in flags}
+        assets.emitted = set()
+        return assets
+
+    def fingerprint(self) -> str:
+        # inlined stylesheets and graphics are part of the document, so a cached document depends on them too
+        if not self.self_contained:
+            return ""
+        stats = []
+        for folder in ("styles", "graphics"):
+            for path in sorted((self.root / folder).rglob("*")):
+                try:
+                    if path.is_file():
+                        stat = path.stat()
+                        stats.append((path.as_posix(), stat.st_mtime_ns, stat.st_size))
+                except FileNotFoundError:
+                    pass
+        stamp = hashlib.sha256(repr(stats).encode("utf-8")).hexdigest()
+        if stamp != self.stamp:
+            # the symbols were built from the old files, documents still being rendered keep the old dict
+            self.symbols = {}
+            self.stamp = stamp
+        return stamp
+
+    def event_path(self, event: str) -> Path:
+        return self.root / "graphics" / "svgs" / f"{event}.svg"
+
+    def flag_path(self, iso2: str) -> Path:
+        return self.root / "graphics" / "flags" / f"{iso2.lower()}.png"
+
+    def symbol(self, symbol_id: str, path: Path) -> tuple[str, str] | None:
+        if symbol_id not in self.symbols:
+            if not path.is_file():
+                return None
+            if path.suffix == ".svg":
+                self.symbols[symbol_id] = svg_symbol(path, symbol_id)
+            else:
+                width, height = png_size(path)
+                data = base64.b64encode(path.read_bytes()).decode("ascii")
+                view_box = f"0 0 {width} {height}"
+                image = f'<image width="{width}" height="{height}" href="data:image/png;base64,{data}"/>'
+                self.symbols[symbol_id] = (f'<symbol id="{symbol_id}" viewBox="{view_box}">{image}</symbol>', view_box)
+        return self.symbols[symbol_id]
+
+    def sprites(self):
+        if not self.self_contained:
+            return ""
+        symbols = [self.symbol(f"event-{event}", self.event_path(event)) for event in sorted(self.events)]
+        symbols += [self.symbol(f"flag-{iso2}", self.flag_path(iso2)) for iso2 in sorted(self.flags)]
+        self.emitted = {f"event-{event}" for event in self.events} | {f"flag-{iso2}" for iso2 in self.flags}
+        body = "".join(symbol for symbol, _ in filter(None, symbols))
+        return f'<svg width="0" height="0" style="position: absolute;" aria-hidden="true">{body}</svg>'
+
+    def reference(self, symbol_id: str, path: Path, cls: str):
+        if not self.self_contained:
+            return f'<img class="{cls}" src="{path.relative_to(self.root).as_posix()}">'
+        if symbol_id in self.emitted and self.symbol(symbol_id, path) is not None:
+            return f'<svg class="{cls}" viewBox="{self.symbols[symbol_id][1]}"><use href="#{symbol_id}"/></svg>'
+        if not path.is_file():
+            return f'<img class="{cls}" src="{path.relative_to(self.root).as_posix()}">'
+        # not part of the sprite sheet, embed this one directly so the document still stands on its own
+        mime = "image/svg+xml" if path.suffix == ".svg" else "image/png"
+        return f'<img class="{cls}" src="data:{mime};base64,{base64.b64encode(path.read_bytes()).decode("ascii")}">'
+
+    def event_icon(self, event: str, cls: str = ""):
+        return self.reference(f"event-{event}", self.event_path(event), cls)
+
+    def flag(self, iso2: str, cls: str = ""):
+        return self.reference(f"flag-{iso2.lower()}", self.flag_path(iso2), cls)
+
+    def stylesheet(self, path: str):
+        if not self.self_contained:
+            return f'<link href="{path}" rel="stylesheet">'
+        return f"<style>\n{(self.root / path).read_text(encoding='utf8')}\n</style>"
+
+    def helpers(self) -> dict:
+        return dict(
+            sprites=self.sprites,
+            event_icon=self.event_icon,
+            flag=self.flag,
+            stylesheet=self.stylesheet,
+        )
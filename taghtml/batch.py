@@ -0,0 +1,101 @@
+import os
+import time
+import json
+import multiprocessing
+import polars as pl
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from .datahandler import CompetitorData, fetch_wcif, load_comp_counts, load_countries, _evict_wcif, _WCIF_MAX_ENTRIES_, _WCIF_TTL_
+from .jinjarenderer import JinjaRenderer, create_environment
+
+# export tables and jinja environments of the current worker process, loaded once and reused for every competition
+_worker_state = {}
+
+
+def fetch_wcifs(comp_ids: list[str], offline=False, ttl=_WCIF_TTL_, threads=8) -> dict[str, bytes | Exception]:
+    # the wcifs are only waiting on the network, so plain threads are enough
+    def fetch(comp_id):
+        try:
+            return fetch_wcif(comp_id, offline, ttl, evict=False)
+        except Exception as e:
+            return e
+    with ThreadPoolExecutor(threads) as pool:
+        wcifs = dict(zip(comp_ids, pool.map(fetch, comp_ids)))
+    # evict once after the batch and never below its size, otherwise a batch would evict its own wcifs
+    _evict_wcif(max(_WCIF_MAX_ENTRIES_, len(comp_ids)))
+    return wcifs
+
+
+def _init_worker(comp_counts: pl.DataFrame, countries: pl.DataFrame):
+    _worker_state["comp_counts"] = comp_counts
+    _worker_state["countries"] = countries
+    _worker_state["environments"] = {}
+
+
+def _render_competition(comp_id: str, wcif: bytes, output_path: Path, renderer_kwargs: dict) -> dict:
+    start = time.perf_counter()
+    comp_data = CompetitorData(comp_id, wcif=wcif, comp_counts=_worker_state["comp_counts"], countries=_worker_state["countries"])
+    template_path = Path(renderer_kwargs["template_path"])
+    environments = _worker_state["environments"]
+    if template_path.parent not in environments:
+        environments[template_path.parent] = create_environment(template_path, auto_reload=False)
+    # the worker pool already uses every core, so the qr codes are generated in the worker itself
+    r = JinjaRenderer(**renderer_kwargs, qr_processes=1, jinja=environments[template_path.parent])
+    r.render_file(comp_data, output_path)
+    return {
+        "comp_id": comp_id,
+        "comp_name": comp_data.comp_name,
+        "output": output_path.as_posix(),
+        "competitors": len(comp_data),
+        "pages": len(r.pages),
+        "seconds": round(time.perf_counter() - start, 3),
+        "error": None,
+    }
+
+
+def _try_render_competition(comp_id: str, *args) -> dict:
+    # one broken competition shouldn't take the rest of the batch down with it
+    try:
+        return _render_competition(comp_id, *args)
+    except Exception as e:
+        return {"comp_id": comp_id, "error": f"{type(e).__name__}: {e}"}
+
+
+def render_batch(comp_ids: list[str], output_dir: Path, renderer_kwargs: dict, offline=False, jobs=None, progress=None, wcif_ttl=_WCIF_TTL_) -> list[dict]:
+    os.makedirs(output_dir, exist_ok=True)
+    comp_ids = list(dict.fromkeys(comp_ids))
+    wcifs = fetch_wcifs(comp_ids, offline, wcif_ttl)
+    summary = {}
+    for comp_id, wcif in wcifs.items():
+        if isinstance(wcif, Exception):
+            summary[comp_id] = {"comp_id": comp_id, "error": f"{type(wcif).__name__}: {wcif}"}
+
+    # the full competition count index is loaded once and shared with every worker
+    comp_counts = load_comp_counts()
+    countries = load_countries()
+    todo = [comp_id for comp_id in comp_ids if comp_id not in summary]
+    jobs = min(jobs or os.cpu_count() or 1, max(len(todo), 1))
+    task = progress.add_task("Rendering competitions.", total=len(todo)) if progress else None
+
+    def collect(comp_id, result):
+        summary[comp_id] = result
+        if progress:
+            progress.update(task, advance=1)
+
+    args = [(comp_id, wcifs[comp_id], output_dir / f"{comp_id}.html", renderer_kwargs) for comp_id in todo]
+    if jobs == 1:
+        _init_worker(comp_counts, countries)
+        for arg in args:
+            collect(arg[0], _try_render_competition(*arg))
+    else:
+        # polars' thread pool doesn't survive a fork, so the workers are spawned
+        with ProcessPoolExecutor(jobs, mp_context=multiprocessing.get_context("spawn"), initializer=_init_worker, initargs=(comp_counts, countries)) as pool:
+            futures = [(arg[0], pool.submit(_try_render_competition, *arg)) for arg in args]
+            for comp_id, future in futures:
+                collect(comp_id, future.result())
+
+    # keep the order of the id file in the summary
+    summary = [summary[comp_id] for comp_id in comp_ids]
+    with open(output_dir / "summary.json", "w", encoding="utf8") as file:
+        json.dump(summary, file, indent=2, ensure_ascii=False)
+    return summary
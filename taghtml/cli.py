@@ -1,13 +1,38 @@
 import typer
 import os
+import json
 import shutil
 from pathlib import Path
 from typing import Annotated
+from taghtml import __version__
 
 app = typer.Typer(add_completion=False, no_args_is_help=True, pretty_exceptions_show_locals=False)
+# separate scripts instead of subcommands, so `taghtml COMP_ID` keeps working
+batch_app = typer.Typer(add_completion=False, no_args_is_help=True, pretty_exceptions_show_locals=False)
+serve_app = typer.Typer(add_completion=False, pretty_exceptions_show_locals=False)
+__PACKAGE_DIR__ = Path(__file__).parent
+__PACKAGE_FOLDERS__ = ["graphics", "styles", "jsons", "templates"]
+__INIT_STAMP__ = Path(".taghtml.json") # delete it to check the directory for missing files again
+
+def package_stamp() -> dict:
+    # a folder's mtime changes whenever a file is added or removed, so the folders stand in for every packaged file
+    folders = {}
+    for name in __PACKAGE_FOLDERS__:
+        folder = __PACKAGE_DIR__ / name
+        folders[name] = folder.stat().st_mtime_ns
+        folders.update((f"{name}/{entry.name}", entry.stat().st_mtime_ns) for entry in os.scandir(folder) if entry.is_dir())
+    return {"version": __version__, "folders": folders}
 
 def init_directory():
-    package_dir = Path(__file__).parent
+    # walking the ~250 packaged files is only needed when the package changed since the last check
+    stamp = package_stamp()
+    try:
+        with open(__INIT_STAMP__, encoding="utf8") as file:
+            if json.load(file) == stamp and all(Path(name).is_dir() for name in __PACKAGE_FOLDERS__):
+                return
+    except (OSError, ValueError):
+        pass
+    package_dir = __PACKAGE_DIR__
     graphics = list((package_dir / "graphics").rglob("*"))
     styles = list((package_dir / "styles").rglob("*"))
     jsons = list((package_dir / "jsons").glob("*"))
@@ -29,6 +54,8 @@ def init_directory():
         # print(f"copy {file.absolute().as_posix()} {rel.absolute().as_posix()}")
         rel.parent.mkdir(parents=True, exist_ok=True)
         shutil.copy(file, rel)
+    with open(__INIT_STAMP__, "w", encoding="utf8") as file:
+        json.dump(stamp, file)
 
 @app.command()
 def main(
@@ -37,41 +64,147 @@ def main(
         height: Annotated[float, typer.Option("--height", "-h", help="Height of each nametag in cm.")] = 5.5,
         width: Annotated[float, typer.Option("--width", "-w", help="Width of each nametag in cm.")] = 8.5, 
         update: Annotated[bool, typer.Option(help="Set this flag to update the database before generating the nametags.")] = False, 
+        offline: Annotated[bool, typer.Option(help="Only use the cached competition data, never contact the WCA website.")] = False,
+        wcif_ttl: Annotated[float, typer.Option(help="Seconds a cached WCIF is used without asking the WCA website whether it changed. By default every run asks, which is cheap when nothing changed.")] = 0,
         template_path: Annotated[Path, typer.Option("--template", "-t", help="Path to the html template file.")] = Path("templates/basic.jinja"), 
         experience_emoji_path: Annotated[Path, typer.Option("--experience-emoji-path", "--eep", help="Path to the json file mapping a number of competitions to an emoji.")] = "jsons/experience_emoji.json", 
         people_emoji_path: Annotated[Path, typer.Option("--people-emoji-path", "--pep", help="Path to the json file mapping wca id to an emoji.")] = "jsons/people_emoji.json", 
         cid_modulo_emoji_path: Annotated[Path, typer.Option("--cid-modulo-emoji-path", "--cep", help="Path to the json file mapping the competitor id to an emoji.")] = "jsons/cid_modulo_emoji.json", 
         papersize: Annotated[str, typer.Option(help="Paper size as standard format or measurements, some examples: A4, Letter, 20cm 30cm, 4in 5in")] = "A4",
+        self_contained: Annotated[bool, typer.Option(help="Embed the stylesheet, event icons and flags into the html file so it works without the styles and graphics folders.")] = False,
+        pdf: Annotated[bool, typer.Option(help="Write a PDF to the output path instead of html, needs `pip install taghtml[pdf]`.")] = False,
+        jobs: Annotated[int | None, typer.Option("--jobs", "-j", help="Number of processes rendering the PDF, defaults to the number of cores.")] = None,
+        watch: Annotated[bool, typer.Option(help="Watch the template, styles, emoji files and graphics and reload the preview in the browser when they change.")] = False,
+        profile: Annotated[str | None, typer.Option(help="Print how long every stage took and how much it processed, either as a 'table' or as 'json'.")] = None,
+        cprofile: Annotated[Path | None, typer.Option(help="Run everything before the server starts under cProfile and write the stats to this file, e.g. for `python -m pstats` or snakeviz.")] = None,
     ):    
     from taghtml.datahandler import update_data, CompetitorData
-    from taghtml.jinjarenderer import JinjaRenderer
+    from taghtml.jinjarenderer import JinjaRenderer, create_environment
+    from taghtml.timing import Timings, record
+    if pdf and not output_path:
+        raise typer.BadParameter("--pdf needs an output path.")
+    if profile not in (None, "table", "json"):
+        raise typer.BadParameter("--profile has to be 'table' or 'json'.")
     init_directory()
     if update:
         update_data()
     from rich.progress import Progress
-    with Progress() as p:
-        cod = p.add_task("Computing data.")
-        comp_data = CompetitorData(comp_id)
-        p.update(cod, completed=100)
-        r = JinjaRenderer(width, height, template_path, experience_emoji_path, people_emoji_path, cid_modulo_emoji_path, papersize)
-        if output_path:
-            rth =  p.add_task("Rendering to HTML.")
+    profiler = None
+    if cprofile:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    with Progress() as p, record(Timings()) as timings:
+        cod = p.add_task("Computing data.", total=1)
+        # show the stage that is running in the description of the current task
+        current = {"task": cod, "description": "Computing data"}
+        timings.listener = lambda name: p.update(current["task"], description=f"{current['description']}: {name}")
+        comp_data = CompetitorData(comp_id, offline, wcif_ttl=wcif_ttl)
+        p.update(cod, description="Computing data.", completed=1)
+        # a file is rendered once, only the preview server has to pick up changes to the template
+        jinja = create_environment(template_path, auto_reload=output_path is None)
+        r = JinjaRenderer(width, height, template_path, experience_emoji_path, people_emoji_path, cid_modulo_emoji_path, papersize, self_contained=self_contained, jinja=jinja)
+        if output_path and pdf:
+            from taghtml.pdf import render_pdf
+            os.makedirs(output_path.parent, exist_ok=True)
+            timings.listener = None
+            render_pdf(r, comp_data, output_path, jobs=jobs, progress=p)
+        elif output_path:
+            rth = p.add_task("Rendering to HTML.", total=1)
+            current.update(task=rth, description="Rendering to HTML")
             os.makedirs(output_path.parent, exist_ok=True)
             r.render_file(comp_data, output_path)
-            p.update(rth, completed=100)
+            p.update(rth, description="Rendering to HTML.", completed=1)
         else:
             r.setup(comp_data)
+    if profiler:
+        profiler.disable()
+        profiler.dump_stats(cprofile)
+    if profile == "table":
+        from rich import print as rprint
+        rprint(timings.table())
+    elif profile == "json":
+        print(timings.to_json())
     if not output_path:
-        import fastapi
-        from fastapi.staticfiles import StaticFiles
-        server = fastapi.FastAPI()
-        @server.get("/")
-        def render(tag_width: float | None = None, tag_height: float | None = None):
-            return fastapi.responses.HTMLResponse(r.render(tag_width, tag_height))
+        from taghtml.server import create_app
         import uvicorn
-        server.mount("/styles", StaticFiles(directory="styles", html=True), name="styles")
-        server.mount("/graphics", StaticFiles(directory="graphics", html=True), name="graphics")
-        uvicorn.run(server, )
+        # open reload connections would otherwise keep the server from shutting down
+        uvicorn.run(create_app(r, watch=watch), timeout_graceful_shutdown=1 if watch else None)
+
+
+@batch_app.command()
+def batch(
+        ids_path: Annotated[Path, typer.Argument(help="Text file with one competition ID per line, lines starting with # are ignored.")],
+        output_dir: Annotated[Path, typer.Argument(help="Folder for the html files, one per competition, and a summary.json.")],
+        height: Annotated[float, typer.Option("--height", "-h", help="Height of each nametag in cm.")] = 5.5,
+        width: Annotated[float, typer.Option("--width", "-w", help="Width of each nametag in cm.")] = 8.5, 
+        update: Annotated[bool, typer.Option(help="Set this flag to update the database before generating the nametags.")] = False, 
+        offline: Annotated[bool, typer.Option(help="Only use the cached competition data, never contact the WCA website.")] = False,
+        wcif_ttl: Annotated[float, typer.Option(help="Seconds a cached WCIF is used without asking the WCA website whether it changed. By default every run asks, which is cheap when nothing changed.")] = 0,
+        template_path: Annotated[Path, typer.Option("--template", "-t", help="Path to the html template file.")] = Path("templates/basic.jinja"), 
+        experience_emoji_path: Annotated[Path, typer.Option("--experience-emoji-path", "--eep", help="Path to the json file mapping a number of competitions to an emoji.")] = "jsons/experience_emoji.json", 
+        people_emoji_path: Annotated[Path, typer.Option("--people-emoji-path", "--pep", help="Path to the json file mapping wca id to an emoji.")] = "jsons/people_emoji.json", 
+        cid_modulo_emoji_path: Annotated[Path, typer.Option("--cid-modulo-emoji-path", "--cep", help="Path to the json file mapping the competitor id to an emoji.")] = "jsons/cid_modulo_emoji.json", 
+        papersize: Annotated[str, typer.Option(help="Paper size as standard format or measurements, some examples: A4, Letter, 20cm 30cm, 4in 5in")] = "A4",
+        self_contained: Annotated[bool, typer.Option(help="Embed the stylesheet, event icons and flags into the html files so they work without the styles and graphics folders.")] = False,
+        jobs: Annotated[int | None, typer.Option("--jobs", "-j", help="Number of competitions rendered in parallel, defaults to the number of cores.")] = None,
+    ):
+    from taghtml.datahandler import update_data
+    from taghtml.batch import render_batch
+    init_directory()
+    if update:
+        update_data()
+    comp_ids = [line.strip() for line in ids_path.read_text(encoding="utf8").splitlines() if line.strip() and not line.strip().startswith("#")]
+    renderer_kwargs = dict(
+        width=width, height=height, template_path=template_path, exp_emoji_path=experience_emoji_path,
+        people_emoji_path=people_emoji_path, cid_modulo_emoji_path=cid_modulo_emoji_path, papersize=papersize,
+        self_contained=self_contained,
+    )
+    from rich.progress import Progress
+    with Progress() as p:
+        summary = render_batch(comp_ids, output_dir, renderer_kwargs, offline, jobs, p, wcif_ttl)
+    from rich.table import Table
+    from rich import print as rprint
+    table = Table("Competition", "Competitors", "Pages", "Seconds", "Output")
+    for entry in summary:
+        if entry["error"]:
+            table.add_row(entry["comp_id"], "", "", "", f"[red]{entry['error']}[/red]")
+        else:
+            table.add_row(entry["comp_id"], str(entry["competitors"]), str(entry["pages"]), f"{entry['seconds']:.2f}", entry["output"])
+    rprint(table)
+    if any(entry["error"] for entry in summary):
+        raise typer.Exit(1)
+
+
+@serve_app.command()
+def serve(
+        height: Annotated[float, typer.Option("--height", "-h", help="Height of each nametag in cm.")] = 5.5,
+        width: Annotated[float, typer.Option("--width", "-w", help="Width of each nametag in cm.")] = 8.5, 
+        update: Annotated[bool, typer.Option(help="Set this flag to update the database before starting the server.")] = False, 
+        offline: Annotated[bool, typer.Option(help="Only use the cached competition data, never contact the WCA website.")] = False,
+        wcif_ttl: Annotated[float, typer.Option(help="Seconds a cached WCIF is used without asking the WCA website whether it changed. By default every run asks, which is cheap when nothing changed.")] = 0,
+        template_path: Annotated[Path, typer.Option("--template", "-t", help="Path to the html template file.")] = Path("templates/basic.jinja"), 
+        experience_emoji_path: Annotated[Path, typer.Option("--experience-emoji-path", "--eep", help="Path to the json file mapping a number of competitions to an emoji.")] = "jsons/experience_emoji.json", 
+        people_emoji_path: Annotated[Path, typer.Option("--people-emoji-path", "--pep", help="Path to the json file mapping wca id to an emoji.")] = "jsons/people_emoji.json", 
+        cid_modulo_emoji_path: Annotated[Path, typer.Option("--cid-modulo-emoji-path", "--cep", help="Path to the json file mapping the competitor id to an emoji.")] = "jsons/cid_modulo_emoji.json", 
+        papersize: Annotated[str, typer.Option(help="Paper size as standard format or measurements, some examples: A4, Letter, 20cm 30cm, 4in 5in")] = "A4",
+        self_contained: Annotated[bool, typer.Option(help="Embed the stylesheet, event icons and flags into the html so it works without the styles and graphics folders.")] = False,
+        competitions: Annotated[int, typer.Option(help="Number of competitions kept loaded in memory.")] = 8,
+        host: Annotated[str, typer.Option(help="Address the server listens on.")] = "127.0.0.1",
+        port: Annotated[int, typer.Option(help="Port the server listens on.")] = 8000,
+    ):
+    from taghtml.datahandler import update_data
+    from taghtml.server import Competitions, create_serve_app
+    import uvicorn
+    init_directory()
+    if update:
+        update_data()
+    renderer_kwargs = dict(
+        width=width, height=height, template_path=template_path, exp_emoji_path=experience_emoji_path,
+        people_emoji_path=people_emoji_path, cid_modulo_emoji_path=cid_modulo_emoji_path, papersize=papersize,
+        self_contained=self_contained,
+    )
+    uvicorn.run(create_serve_app(Competitions(renderer_kwargs, competitions, offline=offline, wcif_ttl=wcif_ttl)), host=host, port=port)
 
 
 if __name__ == "__main__":
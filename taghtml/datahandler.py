@@ -1,31 +1,224 @@
 import pathlib
 import os
-import requests
+import shutil
 import zipfile
 import polars as pl
-import warnings
 import datetime
-from rich.progress import Progress
+import re
+import json
+import time
+import bisect
 from typing import List
 from dataclasses import dataclass
+from .timing import active, stage
 
-_DATA_ = (pathlib.Path(__file__).parent.parent / "data").absolute()
+# TAGHTML_DATA points the export, caches and indexes to another folder, e.g. for benchmarks
+_DATA_ = pathlib.Path(os.environ.get("TAGHTML_DATA", pathlib.Path(__file__).parent.parent / "data")).absolute()
+_EXPORT_URL_ = "https://www.worldcubeassociation.org/export/results/WCA_export.tsv.zip"
+_EXPORT_ZIP_ = _DATA_ / "export.zip"
+_EXPORT_META_ = _DATA_ / "export.json"
+# the only tables of the export the pipeline reads
+_EXPORT_MEMBERS_ = ["WCA_export_Results.tsv", "WCA_export_Countries.tsv"]
+_COMP_COUNTS_ = _DATA_ / "comp_counts.parquet"
+_COMP_COUNTS_STAMP_ = _DATA_ / "comp_counts.json"
+_WCA_API_ = "https://worldcubeassociation.org/api/v0"
+_WCIF_ = _DATA_ / "wcif"
+# seconds a cached wcif is used without asking the WCA, revalidating is a cheap 304 when nothing changed
+# and organisers change groups right up to printing, so by default every run asks
+_WCIF_TTL_ = 0
+_WCIF_MAX_ENTRIES_ = 32
+_WCIF_MAX_BYTES_ = 256 * 1024 * 1024
 
 
-def update_data():
-    with Progress() as p:
-        ted = p.add_task("Downloading export", total=1)
-        os.makedirs(_DATA_, exist_ok=True)
-        r = requests.get("https://www.worldcubeassociation.org/export/results/WCA_export.tsv.zip")
-        p.update(ted, completed=1)
-        twf = p.add_task("Writing to file", total=1)
-        with open(_DATA_ / "export.zip", "wb") as file:
-            file.write(r.content)
-        p.update(twf, completed=1)
-        ext = p.add_task("Extracting", total=1)
-        with zipfile.ZipFile(_DATA_ / "export.zip", "r") as file:
-            file.extractall(_DATA_)
-        p.update(ext, completed=1)
+def export_stamp() -> str:
+    # the extracted results file is rewritten on every update, so its size and mtime identify the export
+    stat = (_DATA_ / "WCA_export_Results.tsv").stat()
+    return f"{stat.st_size}-{stat.st_mtime_ns}"
+
+
+# count the competitions of every person once per export and store them as a parquet index sorted by personId
+def build_comp_counts():
+    stamp = export_stamp()
+    (
+        pl.scan_csv(_DATA_ / "WCA_export_Results.tsv", separator="\t")
+        .group_by("personId")
+        .agg(pl.col("competitionId").n_unique().alias("numComps"))
+        .sort("personId")
+        .collect()
+        # small row groups keep the min/max statistics selective for keyed lookups
+        .write_parquet(_COMP_COUNTS_, row_group_size=16384, statistics=True)
+    )
+    with open(_COMP_COUNTS_STAMP_, "w", encoding="utf8") as file:
+        json.dump({"export": stamp}, file)
+
+
+def comp_counts_current() -> bool:
+    if not _COMP_COUNTS_.is_file() or not _COMP_COUNTS_STAMP_.is_file():
+        return False
+    try:
+        with open(_COMP_COUNTS_STAMP_, encoding="utf8") as file:
+            return json.load(file).get("export") == export_stamp()
+    except (OSError, ValueError):
+        return False
+
+
+# returns the number of competitions for the given wca ids, or for everyone if wca_ids is None
+def load_comp_counts(wca_ids=None) -> pl.DataFrame:
+    if not comp_counts_current():
+        with stage("index_export"):
+            build_comp_counts()
+    with stage("comp_counts") as counts:
+        comp_counts = pl.scan_parquet(_COMP_COUNTS_)
+        if wca_ids is not None:
+            comp_counts = comp_counts.filter(pl.col("personId").is_in(list(wca_ids)))
+        comp_counts = comp_counts.collect()
+        counts["rows"] = comp_counts.height
+    return comp_counts
+
+
+def load_countries() -> pl.DataFrame:
+    return pl.read_csv(_DATA_ / "WCA_export_Countries.tsv", separator="\t")
+
+
+def _read_json(path: pathlib.Path) -> dict:
+    try:
+        with open(path, encoding="utf8") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_json(path: pathlib.Path, value: dict):
+    with open(path, "w", encoding="utf8") as file:
+        json.dump(value, file)
+
+
+def _validators(response: "requests.Response") -> dict:
+    return {
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+    }
+
+
+def update_data(url: str = _EXPORT_URL_, chunk_size: int = 1 << 20):
+    import requests
+    from rich.progress import Progress
+    os.makedirs(_DATA_, exist_ok=True)
+    meta = _read_json(_EXPORT_META_)
+    partial = _EXPORT_ZIP_.with_name(_EXPORT_ZIP_.name + ".part")
+    extracted = all((_DATA_ / member).is_file() for member in _EXPORT_MEMBERS_)
+    headers = {}
+    offset = 0
+    if partial.is_file() and meta.get("partial"):
+        # resume an interrupted download, If-Range makes the server send everything again if the export changed meanwhile
+        offset = partial.stat().st_size
+        validator = meta["partial"].get("etag") or meta["partial"].get("last_modified")
+        headers["Range"] = f"bytes={offset}-"
+        if validator:
+            headers["If-Range"] = validator
+    elif _EXPORT_ZIP_.is_file() and extracted:
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+    r = requests.get(url, headers=headers, stream=True, timeout=30)
+    if r.status_code == 416:
+        # the partial file does not fit the export on the server anymore, start over
+        r.close()
+        partial.unlink()
+        _write_json(_EXPORT_META_, {k: v for k, v in meta.items() if k != "partial"})
+        return update_data(url, chunk_size)
+
+    with r, Progress() as p:
+        if r.status_code == 304:
+            p.console.print("WCA export is already up to date.")
+        else:
+            r.raise_for_status()
+            if r.status_code != 206:
+                offset = 0
+            length = r.headers.get("Content-Length")
+            ted = p.add_task("Downloading export", total=offset + int(length) if length else None, completed=offset)
+            _write_json(_EXPORT_META_, {**meta, "partial": _validators(r)})
+            with open(partial, "ab" if offset else "wb") as file:
+                for chunk in r.iter_content(chunk_size=chunk_size):
+                    file.write(chunk)
+                    p.update(ted, advance=len(chunk))
+            os.replace(partial, _EXPORT_ZIP_)
+            _write_json(_EXPORT_META_, _validators(r))
+            extracted = False
+
+        if not extracted:
+            ext = p.add_task("Extracting", total=len(_EXPORT_MEMBERS_))
+            with zipfile.ZipFile(_EXPORT_ZIP_, "r") as file:
+                members = {pathlib.PurePosixPath(name).name: name for name in file.namelist()}
+                for member in _EXPORT_MEMBERS_:
+                    # write to a flat path inside the data folder no matter where the member lives in the archive
+                    with file.open(members[member]) as src, open(_DATA_ / member, "wb") as dst:
+                        shutil.copyfileobj(src, dst, chunk_size)
+                    p.update(ext, advance=1)
+        if not comp_counts_current():
+            idx = p.add_task("Indexing competition counts", total=1)
+            build_comp_counts()
+            p.update(idx, completed=1)
+
+def _evict_wcif(max_entries: int = _WCIF_MAX_ENTRIES_, max_bytes: int = _WCIF_MAX_BYTES_):
+    # the mtime of the meta file is bumped on every use, so sorting by it gives the least recently used competitions
+    # other threads or processes may evict or replace entries at the same time, files that are gone are skipped
+    metas = []
+    for meta_path in _WCIF_.glob("*.meta.json"):
+        try:
+            metas.append((meta_path.stat().st_mtime, meta_path))
+        except FileNotFoundError:
+            pass
+    metas.sort(reverse=True)
+    total = 0
+    for i, (_, meta_path) in enumerate(metas):
+        path = meta_path.with_name(meta_path.name.removesuffix(".meta.json") + ".json")
+        try:
+            total += path.stat().st_size
+        except FileNotFoundError:
+            pass
+        if i >= max_entries or total > max_bytes:
+            path.unlink(missing_ok=True)
+            meta_path.unlink(missing_ok=True)
+
+
+def fetch_wcif(comp_id: str, offline: bool = False, ttl: float = _WCIF_TTL_, evict: bool = True) -> bytes:
+    os.makedirs(_WCIF_, exist_ok=True)
+    path = _WCIF_ / f"{comp_id}.json"
+    meta_path = _WCIF_ / f"{comp_id}.meta.json"
+    meta = _read_json(meta_path)
+    cached = path.is_file() and bool(meta)
+    if cached and (offline or time.time() - meta.get("fetched_at", 0) < ttl):
+        try:
+            os.utime(meta_path)
+            return path.read_bytes()
+        except FileNotFoundError:
+            # evicted by someone else in the meantime
+            cached = False
+    if offline:
+        raise FileNotFoundError(f"There is no cached WCIF for {comp_id}, run once without --offline to download it.")
+
+    # requests takes a while to import and isn't needed as long as the cached wcif is fresh
+    import requests
+    headers = {}
+    if cached and meta.get("etag"):
+        headers["If-None-Match"] = meta["etag"]
+    if cached and meta.get("last_modified"):
+        headers["If-Modified-Since"] = meta["last_modified"]
+    r = requests.get(f"{_WCA_API_}/competitions/{comp_id}/wcif/public", headers=headers, timeout=30)
+    if r.status_code == 304 and cached:
+        _write_json(meta_path, {**meta, "fetched_at": time.time()})
+        return path.read_bytes()
+    r.raise_for_status()
+    partial = path.with_name(path.name + ".part")
+    partial.write_bytes(r.content)
+    os.replace(partial, path)
+    _write_json(meta_path, {**_validators(r), "fetched_at": time.time()})
+    if evict:
+        _evict_wcif()
+    return r.content
 
 @dataclass
 class Assignment:
@@ -50,97 +243,225 @@ class Competitor:
     assignments: List[Assignment]
     roles: List[str]
 
+_ROLES_ = ["competitor", "runner", "judge", "scrambler", "delegate", "lead"]
+_WCA_ID_PATTERN_ = re.compile(r"\d{4}[A-Za-z]{4}\d{2}")
+_WCIF_TIME_FORMAT_ = "%Y-%m-%dT%H:%M:%SZ"
+
+
+# one row per group of the schedule, activities without groups count as a single group unless they are "other" activities
+def load_activities(schedule: dict) -> pl.DataFrame:
+    rows = [
+        (child_activity['id'], child_activity['activityCode'], activity['startTime'], activity['endTime'], child_activity['startTime'], child_activity['endTime'], room['name'])
+        for venue in schedule['venues']
+        for room in venue['rooms']
+        for activity in room['activities']
+        for child_activity in (activity['childActivities'] or ([] if 'other' in activity['activityCode'] else [activity]))
+    ]
+    schema = {
+        "activityId": pl.Int64, "activityCode": pl.String, "startTime": pl.String, "endTime": pl.String,
+        "groupStartTime": pl.String, "groupEndTime": pl.String, "roomName": pl.String,
+    }
+    code = pl.col("activityCode").str.split("-")
+    return (
+        pl.DataFrame(rows, schema=schema, orient="row")
+        .filter(code.list.len() >= 3)
+        .select(
+            "activityId",
+            code.list.get(0).alias("event"),
+            code.list.get(1).str.slice(1).cast(pl.Int64, strict=False).alias("round"),
+            code.list.get(2).str.slice(1).cast(pl.Int64, strict=False).alias("group"),
+            pl.col("startTime").str.to_datetime(_WCIF_TIME_FORMAT_, time_zone="UTC").alias("start_time"),
+            pl.col("endTime").str.to_datetime(_WCIF_TIME_FORMAT_, time_zone="UTC").alias("end_time"),
+            pl.col("groupStartTime").str.to_datetime(_WCIF_TIME_FORMAT_, time_zone="UTC").alias("group_start_time"),
+            pl.col("groupEndTime").str.to_datetime(_WCIF_TIME_FORMAT_, time_zone="UTC").alias("group_end_time"),
+            pl.col("roomName").str.to_lowercase().str.replace_all(" ", "-", literal=True).alias("room_name"),
+        )
+        .drop_nulls(["round", "group"])
+    )
+
+
+# resolves the assignments of every person to the row of their activity, in the order of the wcif
+def load_assignments(persons: list[dict], activities: pl.DataFrame) -> pl.DataFrame:
+    # flattening the nested lists in python is much cheaper than letting polars build a series per person
+    rows = [
+        (person['registrantId'], assignment['activityId'], assignment['assignmentCode'])
+        for person in persons
+        for assignment in person['assignments']
+    ]
+    schema = {"registrantId": pl.Int64, "activityId": pl.Int64, "assignmentCode": pl.String}
+    role = (
+        pl.col("assignmentCode")
+        .str.replace_all("staff-", "", literal=True)
+        .str.replace_all("stagelead", "lead", literal=True)
+    )
+    return (
+        pl.DataFrame(rows, schema=schema, orient="row")
+        .drop_nulls(["registrantId", "activityId"])
+        .with_row_index("order")
+        .with_columns(role.alias("role"))
+        .filter(pl.col("role").is_in(_ROLES_))
+        .join(activities.select("activityId", "activity"), on="activityId", how="inner")
+        .sort("order")
+        .group_by("registrantId", maintain_order=True)
+        .agg("activity", "role")
+    )
+
+
+class CompetitorAssignments:
+    # maps registrantId to the list of assignments, the Assignment objects are only built when a competitor is accessed
+    def __init__(self, activities: pl.DataFrame, assignments: pl.DataFrame) -> None:
+        self.activities = activities
+        self.assignments = {registrant_id: (activity, role) for registrant_id, activity, role in assignments.iter_rows()}
+        self.instances: dict[(int, str), Assignment] = {}
+        self.activity_kwargs = None
+        self.cache: dict[int, List[Assignment]] = {}
+
+    def assignment(self, activity: int, role: str) -> Assignment:
+        # everyone with the same role in the same group shares one Assignment
+        if self.activity_kwargs is None:
+            # the schedule is small, so all of its timestamps are converted to local time in one go
+            self.activity_kwargs = [
+                {key: value.astimezone() if isinstance(value, datetime.datetime) else value for key, value in row.items()}
+                for row in self.activities.drop("activityId", "activity").iter_rows(named=True)
+            ]
+        key = (activity, role)
+        if key not in self.instances:
+            self.instances[key] = Assignment(role=role, **self.activity_kwargs[activity])
+        return self.instances[key]
+
+    def __getitem__(self, registrant_id: int) -> List[Assignment]:
+        if registrant_id not in self.cache:
+            activity, role = self.assignments.get(registrant_id, ([], []))
+            self.cache[registrant_id] = [self.assignment(a, r) for a, r in zip(activity, role)]
+        return self.cache[registrant_id]
+
+    def __contains__(self, registrant_id: int) -> bool:
+        return registrant_id in self.assignments
+
+    def __len__(self):
+        return len(self.assignments)
+
+
 class CompetitorData:
-    def __init__(self, comp_id) -> None:
+    # wcif, comp_counts and countries can be passed in when they were already loaded, e.g. for batches of competitions
+    def __init__(self, comp_id, offline=False, wcif: bytes | None = None, comp_counts: pl.DataFrame | None = None, countries: pl.DataFrame | None = None, wcif_ttl: float = _WCIF_TTL_) -> None:
         self.data = None
+        self.offline = offline
+        self.wcif_ttl = wcif_ttl
+        self.wcif = wcif
+        self.comp_counts = comp_counts
+        self.countries = countries
         self.competitor_assignments = None
         self.comp_id = comp_id
         self.comp_name = None
+        self.indexes = None
         self.event_times: dict[(str, int), (datetime.datetime, datetime.datetime)] = {}
         self.prepare_data()
         self.index = 0
 
     def prepare_data(self):
-        comp_data = requests.request("GET", f'https://worldcubeassociation.org/api/v0/competitions/{self.comp_id}/wcif/public').json()
-        competitor_data = pl.DataFrame(comp_data['persons'])
-
-        # count the number of competitions each competitor has been to
-        comp_counts = (
-            pl.scan_csv(_DATA_ / "WCA_export_Results.tsv", separator="\t")
-            .group_by(['personId'])
-            .agg(
-                pl.col("competitionId").n_unique().alias("numComps")
-                ))
-        self.data = (
-            competitor_data.lazy()
-            .join(comp_counts, left_on="wcaId", right_on="personId", how="left")
-            .join(pl.scan_csv(_DATA_ / "WCA_export_Countries.tsv", separator="\t"), left_on='countryIso2', right_on='iso2')
-            .select(
-                'registrantId', 'wcaId', 'name', 
-                pl.col("id").alias("country"), 
-                pl.col("countryIso2").alias('iso2'), 
-                pl.col("numComps").fill_null(0) + 1,
-                'roles'
+        if self.wcif is None:
+            with stage("fetch_wcif", desc=self.comp_id) as counts:
+                self.wcif = fetch_wcif(self.comp_id, self.offline, self.wcif_ttl)
+                counts["bytes"] = len(self.wcif)
+        with stage("parse_wcif") as counts:
+            comp_data = json.loads(self.wcif)
+            # only the columns that are used, the rest of the person data is deeply nested and expensive to convert
+            competitor_data = pl.DataFrame(
+                [(person['registrantId'], person['wcaId'], person['name'], person['countryIso2'], person['roles']) for person in comp_data['persons']],
+                schema={"registrantId": pl.Int64, "wcaId": pl.String, "name": pl.String, "countryIso2": pl.String, "roles": pl.List(pl.String)},
+                orient="row",
             )
-            .sort("name")
-            .collect()
-        )
-        
-        activities = {}
-        for venue in comp_data['schedule']['venues']:
-            	for room in venue['rooms']:
-                    for activity in room["activities"]:
-                        child_activities = activity['childActivities']
-                        if 'other' not in activity['activityCode'] and not child_activities:
-                            child_activities = [activity]
-                        for child_activity in child_activities:
-                            try:
-                                event, round_, group = child_activity['activityCode'].split('-')[:3]
-                            except:
-                                continue
-                            start_time = datetime.datetime.strptime(activity["startTime"], "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=datetime.UTC).astimezone()
-                            end_time = datetime.datetime.strptime(activity["endTime"], "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=datetime.UTC).astimezone()
-                            group_start_time = datetime.datetime.strptime(child_activity["startTime"], "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=datetime.UTC).astimezone()
-                            group_end_time = datetime.datetime.strptime(child_activity["endTime"], "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=datetime.UTC).astimezone()
-                            activities[child_activity['id']] = {
-                                'event': event,
-                                'round': int(round_[1:]),
-                                'group': int(group[1:]),
-                                'start_time': start_time,
-                                'group_start_time': group_start_time,
-                                'group_end_time': group_end_time,
-                                'end_time': end_time,
-                                'room_name': room['name'].lower().replace(' ', '-'),
-                            }
-                            key = (event, int(round_[1:]))
-                            if key not in self.event_times: # TODO: change to list for mbld and fmc
-                                self.event_times[key] = (start_time, end_time)
-        competitor_assignments = {}
-        for person in comp_data['persons']:
-            person_assignments = []
-            for assignment in person['assignments']:
-                activity_id = assignment['activityId']
-                try:
-                    activity = activities[activity_id]
-                except KeyError as e:
-                    # warnings.warn(f"Tried to access non-existant activity {activity_id}")
-                    continue
-                try:
-                    role = assignment['assignmentCode'].replace("staff-", "").replace("stagelead", "lead")
-                    if role not in ["competitor", "runner", "judge", "scrambler", "delegate", "lead"]:
-                        continue
-
-                    person_assignments.append(Assignment(
-                            role=role, 
-                            **activity
-                        )
-                    )
-                except KeyError as e:
-                    warnings.warn(f"Assignments other than competitor/judge/scrambler are not yet supported {assignment}")
-            competitor_assignments[person['registrantId']] = person_assignments
-        self.competitor_assignments = competitor_assignments
+            counts["persons"] = competitor_data.height
+
+        # look up the number of competitions each competitor has been to
+        comp_counts = self.comp_counts
+        if comp_counts is None:
+            comp_counts = load_comp_counts(competitor_data["wcaId"].drop_nulls())
+        countries = self.countries if self.countries is not None else load_countries()
+        with stage("join_competitors") as counts:
+            self.data = (
+                competitor_data.lazy()
+                .join(comp_counts.lazy(), left_on="wcaId", right_on="personId", how="left")
+                .join(countries.lazy(), left_on='countryIso2', right_on='iso2')
+                .select(
+                    'registrantId', 'wcaId', 'name', 
+                    pl.col("id").alias("country"), 
+                    pl.col("countryIso2").alias('iso2'), 
+                    pl.col("numComps").fill_null(0) + 1,
+                    'roles'
+                )
+                .sort("name")
+                .collect()
+            )
+            counts["competitors"] = self.data.height
+
+        with stage("schedule") as counts:
+            activities = load_activities(comp_data['schedule'])
+            counts["activities"] = activities.height
+            # the first activity of every round in schedule order, before duplicated ids are dropped
+            for event, round_, start_time, end_time in (
+                activities
+                .unique(["event", "round"], keep="first", maintain_order=True)
+                .select("event", "round", "start_time", "end_time")
+                .iter_rows()
+            ): # TODO: change to list for mbld and fmc
+                self.event_times[(event, round_)] = (start_time.astimezone(), end_time.astimezone())
+            activities = activities.unique("activityId", keep="last", maintain_order=True).with_row_index("activity")
+        with stage("assignments") as counts:
+            assignments = load_assignments(comp_data['persons'], activities)
+            self.competitor_assignments = CompetitorAssignments(activities, assignments)
+            if active():
+                counts["assignments"] = sum(len(activity) for activity, _ in self.competitor_assignments.assignments.values())
         self.comp_name = comp_data['shortName']
 
+    def build_indexes(self):
+        # row of every registrantId and WCA ID, plus the casefolded names in sorted order for prefix searches
+        registrant_ids = self.data["registrantId"].to_list()
+        wca_ids = self.data["wcaId"].to_list()
+        names = sorted((name.casefold(), row) for row, name in enumerate(self.data["name"].to_list()))
+        self.indexes = (
+            {registrant_id: row for row, registrant_id in enumerate(registrant_ids)},
+            {wca_id.upper(): row for row, wca_id in enumerate(wca_ids) if wca_id},
+            [name for name, _ in names],
+            [row for _, row in names],
+        )
+
+    def row_by_registrant_id(self, registrant_id: int) -> int | None:
+        if self.indexes is None:
+            self.build_indexes()
+        return self.indexes[0].get(registrant_id)
+
+    def row_by_wca_id(self, wca_id: str) -> int | None:
+        if self.indexes is None:
+            self.build_indexes()
+        return self.indexes[1].get(wca_id.upper())
+
+    def rows_by_name_prefix(self, prefix: str) -> list[int]:
+        if self.indexes is None:
+            self.build_indexes()
+        _, _, names, rows = self.indexes
+        prefix = prefix.casefold()
+        start = bisect.bisect_left(names, prefix)
+        end = start
+        while end < len(names) and names[end].startswith(prefix):
+            end += 1
+        return sorted(rows[start:end])
+
+    def find(self, query: str) -> list[int]:
+        # rows for a registrantId, a WCA ID or the start of a name, in that order
+        query = query.strip()
+        if not query:
+            return []
+        if query.isdigit():
+            row = self.row_by_registrant_id(int(query))
+            return [] if row is None else [row]
+        if _WCA_ID_PATTERN_.fullmatch(query):
+            row = self.row_by_wca_id(query)
+            if row is not None:
+                return [row]
+        return self.rows_by_name_prefix(query)
+
     def __getitem__(self, key: int) -> Competitor:
         idx, wca_id, name, country, iso2, num_competitions, roles = self.data.row(key)
         return Competitor(idx, wca_id, name, country, iso2, num_competitions, self.competitor_assignments[idx], roles)
@@ -1,26 +1,39 @@
 import math
 import json
+import os
+import hashlib
+import functools
+import itertools
+import multiprocessing
+import threading
 import jinja2
 import re
-import qrcode
-import qrcode.image.svg
 import base64
 import urllib
 import urllib.parse
 import datetime
+import polars as pl
 from json import JSONEncoder
 from jinja2 import FileSystemLoader
 from pathlib import Path
 from papersize import parse_papersize
 from collections import defaultdict
 from collections import OrderedDict
-from .datahandler import Competitor, CompetitorData, Assignment
+from concurrent.futures import ProcessPoolExecutor
+from .datahandler import Competitor, CompetitorData, Assignment, _DATA_
+from .assets import Assets
+from .timing import active, stage
 
 __TEMPLATE__ = Path(__file__).absolute().parent.parent / "template.html"
 __EXP_EMOJI__ = Path(__file__).absolute().parent.parent / "experience_emoji.json"
 __PEOPLE_EMOJI__ = Path(__file__).absolute().parent.parent / "people_emoji.json"
 __CID_MODULO_EMOJI__ = Path(__file__).absolute().parent.parent / "cid_modulo_emoji.json"
 __FLAG_BASE_CODE__ = 127397
+__QR_FILL__ = "#fff"
+__QR_CACHE__ = _DATA_ / "qr"
+__JINJA_CACHE__ = _DATA_ / "jinja" # compiled templates, keyed by the checksum of their source
+__QR_PARALLEL_MIN__ = 64 # below this many missing codes a process pool costs more than it saves
+__QR_MAX_ENTRIES__ = 50_000 # roughly 200 MB of cached codes
 
 def iso2flag(iso2: str):
     return ''.join([chr(__FLAG_BASE_CODE__ + ord(c)) for c in iso2.upper()])
@@ -31,12 +44,19 @@ def seperate_native_name(name):
     native_name = matches.group(3)
     return latin_name.strip(), native_name.strip() if native_name else ""
 
-def make_qr(data):
-    factory = qrcode.image.svg.SvgPathImage
-    factory.QR_PATH_STYLE["fill"] = "#fff"
+@functools.cache
+def qr_image_factory(fill: str):
+    # a subclass per fill colour instead of changing the style shared by every SvgPathImage
+    import qrcode.image.svg
+    base = qrcode.image.svg.SvgPathImage
+    return type(base.__name__, (base,), {"QR_PATH_STYLE": {**base.QR_PATH_STYLE, "fill": fill}})
+
+def make_qr(data, fill=__QR_FILL__):
+    # qrcode is only imported once a code isn't in the cache
+    import qrcode
     qr = qrcode.QRCode(
         version=None,
-        image_factory=factory,
+        image_factory=qr_image_factory(fill),
         border=0
     )
     qr.add_data(data)
@@ -44,6 +64,138 @@ def make_qr(data):
     img = qr.make_image()
     return "data:image/svg+xml;base64," + base64.b64encode(img.to_string(encoding="utf-8")).decode("utf-8")
 
+def qr_cache_key(data, fill=__QR_FILL__):
+    return hashlib.sha256(f"{fill}\n{data}".encode("utf-8")).hexdigest()
+
+def _evict_qrs(keep: set[str], max_entries: int = __QR_MAX_ENTRIES__):
+    # drops the oldest codes once the cache is full, never the ones that were just asked for
+    entries = []
+    with os.scandir(__QR_CACHE__) as it:
+        for entry in it:
+            try:
+                entries.append((entry.stat().st_mtime, entry.name))
+            except FileNotFoundError:
+                pass # removed by another process meanwhile
+    if len(entries) <= max_entries:
+        return
+    entries.sort()
+    for _, name in entries[:len(entries) - max_entries]:
+        if name not in keep:
+            (__QR_CACHE__ / name).unlink(missing_ok=True)
+
+def make_qrs(datas: list[str], fill=__QR_FILL__, processes=None) -> list[str]:
+    # looks up every code in the content addressed cache and generates the missing ones on a process pool
+    with stage("qr", codes=len(datas)) as counts:
+        os.makedirs(__QR_CACHE__, exist_ok=True)
+        keys = [qr_cache_key(data, fill) for data in datas]
+        codes = {}
+        missing = {}
+        for data, key in zip(datas, keys):
+            if key in codes or key in missing:
+                continue
+            try:
+                codes[key] = (__QR_CACHE__ / key).read_text(encoding="utf8")
+            except FileNotFoundError:
+                missing[key] = data
+        if missing:
+            workers = processes or os.cpu_count() or 1
+            if workers == 1 or len(missing) < __QR_PARALLEL_MIN__:
+                generated = [make_qr(data, fill) for data in missing.values()]
+            else:
+                # polars' thread pool doesn't survive a fork, so the workers are spawned like in batch and pdf
+                with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+                    chunksize = max(1, len(missing) // (4 * workers))
+                    generated = list(pool.map(make_qr, missing.values(), itertools.repeat(fill), chunksize=chunksize))
+            for key, code in zip(missing, generated):
+                codes[key] = code
+                partial = __QR_CACHE__ / f"{key}.{os.getpid()}.{threading.get_ident()}.part"
+                partial.write_text(code, encoding="utf8")
+                os.replace(partial, __QR_CACHE__ / key)
+            _evict_qrs(set(keys))
+        counts["generated"] = len(missing)
+    return [codes[key] for key in keys]
+
+
+def _no_assignment():
+    return None
+
+def _rounds():
+    return defaultdict(list)
+
+def group_assignments(assignments: list[Assignment]):
+    # assignments by event and round, the first competitor assignment and the helper assignments of every first round
+    event_assignments = defaultdict(_rounds)
+    event_comp_r1_assignments = defaultdict(_no_assignment)
+    event_help_r1_assignments = defaultdict(list)
+    for assignment in assignments:
+        event_assignments[assignment.event][f"r{assignment.round}"].append(assignment)
+        if assignment.round != 1:
+            continue
+        if assignment.role == "competitor":
+            if not assignment.event in event_comp_r1_assignments:
+                event_comp_r1_assignments[assignment.event] = assignment # TODO: change to list for fmc and mbld
+        else:
+            event_help_r1_assignments[assignment.event].append(assignment)
+    return event_assignments, event_comp_r1_assignments, event_help_r1_assignments
+
+
+class RenderRecord:
+    # what the templates see of a competitor, reads like the dict it used to be but without a dict per competitor
+    __slots__ = (
+        "name", "native_name", "wca_id", "iso2", "iso2flag", "firstname", "lastname", "assignments",
+        "event_assignments", "event_comp_r1_assignments", "event_help_r1_assignments",
+        "cid_emoji", "pep_emoji", "exp_emoji", "id", "country", "num_competitions", "roles", "qr",
+    )
+    _fields = frozenset(__slots__)
+
+    def __init__(
+            self, name, native_name, wca_id, iso2, iso2flag, firstname, lastname, assignments,
+            event_assignments, event_comp_r1_assignments, event_help_r1_assignments,
+            cid_emoji, pep_emoji, exp_emoji, id, country, num_competitions, roles, qr) -> None:
+        self.name = name
+        self.native_name = native_name
+        self.wca_id = wca_id
+        self.iso2 = iso2
+        self.iso2flag = iso2flag
+        self.firstname = firstname
+        self.lastname = lastname
+        self.assignments = assignments
+        self.event_assignments = event_assignments
+        self.event_comp_r1_assignments = event_comp_r1_assignments
+        self.event_help_r1_assignments = event_help_r1_assignments
+        self.cid_emoji = cid_emoji
+        self.pep_emoji = pep_emoji
+        self.exp_emoji = exp_emoji
+        self.id = id
+        self.country = country
+        self.num_competitions = num_competitions
+        self.roles = roles
+        self.qr = qr
+
+    def __getitem__(self, key):
+        if key not in self._fields:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key):
+        return key in self._fields
+
+    def __iter__(self):
+        return iter(self.__slots__)
+
+    def __len__(self):
+        return len(self.__slots__)
+
+    def keys(self):
+        return self.__slots__
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self._fields else default
+
+    def __repr__(self):
+        return repr({key: getattr(self, key) for key in self.__slots__})
+
+
 # keep this code around to save an example of the data structure
 def simplify_competitor_dict(competitor_dict):
     event_assignments = dict([(k, dict(v)) for k, v in competitor_dict["event_assignments"].items()][:2])
@@ -66,114 +218,269 @@ def save_data_dict_sample(data_dict):
         file.write(str(sample_dict))
 
 
+# auto_reload checks the template on disk on every get_template, only worth it when the template can change while running
+def create_environment(template_path: Path, auto_reload=True) -> jinja2.Environment:
+    os.makedirs(__JINJA_CACHE__, exist_ok=True)
+    return jinja2.Environment(
+        loader=FileSystemLoader(template_path.parent.absolute().as_posix()),
+        autoescape=False,
+        auto_reload=auto_reload,
+        bytecode_cache=jinja2.FileSystemBytecodeCache(__JINJA_CACHE__.as_posix()),
+    )
+
+
+class PageCursor:
+    # stands in for the list of pages in the template and remembers which page the template is at
+    def __init__(self, pages) -> None:
+        self.pages = pages
+        self.position = -1
+
+    def __iter__(self):
+        for self.position, page in enumerate(self.pages):
+            yield page
+
+    def __len__(self):
+        return len(self.pages)
+
+    def __getitem__(self, key):
+        return self.pages[key]
+
+
 class JinjaRenderer:
     def __init__(
             self, width, height, template_path=__TEMPLATE__, 
             exp_emoji_path=__EXP_EMOJI__, people_emoji_path=__PEOPLE_EMOJI__,
-            cid_modulo_emoji_path=__CID_MODULO_EMOJI__, papersize="A4") -> None:
+            cid_modulo_emoji_path=__CID_MODULO_EMOJI__, papersize="A4", qr_processes=None, jinja=None, self_contained=False) -> None:
         self.page_width, self.page_height = map(float, parse_papersize(papersize, "cm"))
         self.tag_width = width
         self.tag_height = height
         self.valid_replace_tags = defaultdict(lambda: defaultdict(bool))
         self.template_path = template_path
-        self.jinja = jinja2.Environment(loader=FileSystemLoader(template_path.parent.absolute().as_posix()), autoescape=False, auto_reload=True)
+        # renderers for the same template folder can share an environment and with it the compiled templates
+        self.jinja = jinja or create_environment(template_path)
         self.events = ["333","222","444","555","666","777","333bf","333fm","333oh","clock","minx","pyram","skewb","sq1","444bf","555bf","333mbf"]
-        self.exp_emoji = json.load(open(exp_emoji_path, encoding="UTF-8"))
-        self.people_emoji: dict = json.load(open(people_emoji_path, encoding="UTF-8"))
-        assert isinstance(self.people_emoji, dict)
-        self.cid_modulo_emoji = json.load(open(cid_modulo_emoji_path, encoding="UTF-8"))
-        if isinstance(self.cid_modulo_emoji, dict):
-            self.cid_modulo_emoji = list(self.cid_modulo_emoji.values())
+        self.exp_emoji_path = exp_emoji_path
+        self.people_emoji_path = people_emoji_path
+        self.cid_modulo_emoji_path = cid_modulo_emoji_path
+        self.load_emojis()
         self.render_dicts = {}
+        self.qr_processes = qr_processes
+        self.competitors = None
+        self.data_version = 0 # bumped whenever the data behind the render dicts changes
+        self.template_references = {}
+        self.assets = Assets(self_contained)
+        # the server renders from several threads, everything that changes the renderer or reads
+        # a consistent snapshot of it (size, pages, template) holds this lock
+        self.lock = threading.RLock()
 
-    
-    def get_render_dict(self, competitor: Competitor):
+
+    def load_emojis(self):
+        # all files are read before anything is assigned, a broken file leaves the previous emojis in place
+        with open(self.exp_emoji_path, encoding="UTF-8") as file:
+            exp_emoji = json.load(file)
+        with open(self.people_emoji_path, encoding="UTF-8") as file:
+            people_emoji = json.load(file)
+        if not isinstance(people_emoji, dict):
+            raise ValueError(f"{self.people_emoji_path} has to contain an object of WCA IDs to emojis.")
+        with open(self.cid_modulo_emoji_path, encoding="UTF-8") as file:
+            cid_modulo_emoji = json.load(file)
+        if isinstance(cid_modulo_emoji, dict):
+            cid_modulo_emoji = list(cid_modulo_emoji.values())
+        self.exp_emoji = exp_emoji
+        self.people_emoji: dict = people_emoji
+        self.cid_modulo_emoji = cid_modulo_emoji
+
+    def reload_emojis(self):
+        # the emojis only end up in the render dicts, so those are rebuilt while the pages just get regrouped
+        with self.lock:
+            self.load_emojis()
+            # only thrown away once the new emojis loaded
+            self.render_dicts = {}
+            self.data_version += 1
+            if self.competitors is not None:
+                self.setup(self.competitors)
+
+    def qr_data(self, competitor: Competitor):
+        return self.qr_url(competitor.idx)
+
+    def qr_url(self, idx: int | None):
+        if idx: # TODO; make link configurable or something, allow configuring color as well
+            return urllib.parse.quote(f"competitiongroups.com/competitions/{self.comp_id}/persons/{idx}")
+        return urllib.parse.quote(f"competitiongroups.com/competitions/{self.comp_id}")
+
+    def get_render_dict(self, competitor: Competitor, qr=None):
         latin_name, native_name = seperate_native_name(competitor.name)
         name_parts = latin_name.split()
         cid_emoji = ""
         if competitor.idx is not None:
             cid_emoji = self.cid_modulo_emoji[competitor.idx % len(self.cid_modulo_emoji)] 
-        event_assignments = defaultdict(lambda: defaultdict(list))
-        for assignment in competitor.assignments:
-            event_assignments[assignment.event][f"r{assignment.round}"].append(assignment)
-
-        event_comp_r1_assignments = defaultdict(lambda: None)
-        event_help_r1_assignments = defaultdict(list)
-        for assignment in competitor.assignments:
-            if assignment.round != 1:
-                continue
-            if assignment.role == "competitor":
-                if not assignment.event in event_comp_r1_assignments:
-                    event_comp_r1_assignments[assignment.event] = assignment # TODO: change to list for fmc and mbld
-            else:
-                event_help_r1_assignments[assignment.event].append(assignment)
-        if competitor.idx: # TODO; make link configurable or something, allow configuring color as well
-            qr = make_qr(urllib.parse.quote(f"competitiongroups.com/competitions/{self.comp_id}/persons/{competitor.idx}"))
-        else:
-            qr = make_qr(urllib.parse.quote(f"competitiongroups.com/competitions/{self.comp_id}"))
-        
-        return {
-            "name": latin_name,
-            "native_name": native_name,
-            "wca_id": competitor.wca_id,
-            "iso2": competitor.iso2,
-            "iso2flag": iso2flag(competitor.iso2),
-            "firstname": name_parts[0],
-            "lastname": " ".join(name_parts[1:]) if len(name_parts) > 1 else "",
-            "assignments": competitor.assignments,
-            "event_assignments": event_assignments,
-            "event_comp_r1_assignments": event_comp_r1_assignments,
-            "event_help_r1_assignments": event_help_r1_assignments,
-            "cid_emoji": cid_emoji,
-            "pep_emoji": self.people_emoji.get(competitor.wca_id, ""),
-            "exp_emoji": self.competition_count_to_emoji(competitor.num_competitions),
-            "id": competitor.idx,
-            "country": competitor.country,
-            "num_competitions": competitor.num_competitions,
-            "roles": competitor.roles,
-            "qr": qr
-        }
+        if qr is None:
+            qr = make_qrs([self.qr_data(competitor)], processes=1)[0]
+
+        return RenderRecord(
+            latin_name,
+            native_name,
+            competitor.wca_id,
+            competitor.iso2,
+            iso2flag(competitor.iso2),
+            name_parts[0],
+            " ".join(name_parts[1:]) if len(name_parts) > 1 else "",
+            competitor.assignments,
+            *group_assignments(competitor.assignments),
+            cid_emoji,
+            self.people_emoji.get(competitor.wca_id, ""),
+            self.competition_count_to_emoji(competitor.num_competitions),
+            competitor.idx,
+            competitor.country,
+            competitor.num_competitions,
+            competitor.roles,
+            qr,
+        )
+
+    def render_columns(self, data: pl.DataFrame) -> pl.DataFrame:
+        # everything of the render dicts that only depends on the row of a competitor, for all rows at once
+        latin_name = pl.col("name").str.extract(r"^([^()]*)", 1).str.strip_chars()
+        name_parts = latin_name.str.replace_all(r"\s+", " ").str.split(" ")
+        # the thresholds are checked in file order and the last one that matches wins
+        exp_emoji = pl.lit("")
+        for count, emoji in self.exp_emoji.items():
+            exp_emoji = pl.when(pl.col("numComps") >= int(count)).then(pl.lit(emoji)).otherwise(exp_emoji)
+        pep_emoji = pl.lit("")
+        if self.people_emoji:
+            pep_emoji = pl.col("wcaId").replace_strict(self.people_emoji, default="", return_dtype=pl.String).fill_null("")
+        # only a few hundred countries, so the flags are looked up per country instead of per competitor
+        flags = {iso2: iso2flag(iso2) for iso2 in data["iso2"].drop_nulls().unique()}
+        return data.select(
+            latin_name.alias("name"),
+            pl.col("name").str.extract(r"^[^()]*\(([^()]*)\)", 1).str.strip_chars().fill_null("").alias("native_name"),
+            "wcaId",
+            "iso2",
+            pl.col("iso2").replace_strict(flags, default="", return_dtype=pl.String).alias("iso2flag"),
+            name_parts.list.first().alias("firstname"),
+            name_parts.list.slice(1).list.join(" ").alias("lastname"),
+            (pl.col("registrantId") % len(self.cid_modulo_emoji))
+                .replace_strict(dict(enumerate(self.cid_modulo_emoji)), default="", return_dtype=pl.String)
+                .fill_null("").alias("cid_emoji"),
+            pep_emoji.alias("pep_emoji"),
+            exp_emoji.alias("exp_emoji"),
+            "registrantId",
+            "country",
+            "numComps",
+            "roles",
+        )
+
+    def get_render_dicts(self, competitors: CompetitorData, rows: list[int]) -> list[RenderRecord]:
+        # the batch version of get_render_dict, only the grouping of the assignments is left per competitor
+        columns = self.render_columns(competitors.data[rows])
+        qrs = make_qrs([self.qr_url(idx) for idx in columns["registrantId"]], processes=self.qr_processes)
+        assignments = competitors.competitor_assignments
+        with stage("render_dicts", competitors=len(rows)) as counts:
+            records = []
+            for (name, native_name, wca_id, iso2, flag, firstname, lastname, cid_emoji, pep_emoji, exp_emoji,
+                 idx, country, num_competitions, roles), qr in zip(zip(*(column.to_list() for column in columns.iter_columns())), qrs):
+                competitor_assignments = assignments[idx]
+                records.append(RenderRecord(
+                    name, native_name, wca_id, iso2, flag, firstname, lastname, competitor_assignments,
+                    *group_assignments(competitor_assignments),
+                    cid_emoji, pep_emoji, exp_emoji, idx, country, num_competitions, roles, qr,
+                ))
+            if active():
+                counts["assignments"] = sum(len(record.assignments) for record in records)
+        return records
     
     def setup(self, competitors: CompetitorData):
         self.columns = int(math.floor(self.page_width / self.tag_width))
         self.rows = int(math.floor(self.page_height / self.tag_height))
         self.per_page = self.columns * self.rows
+        if competitors is not self.competitors:
+            self.data_version += 1
         self.competitors = competitors
         self.comp_id = competitors.comp_id
         self.comp_name = competitors.comp_name
-        pages: list[list[dict]] = []
-        current_page = []
-        for i, competitor in enumerate(competitors):
-            if i % self.per_page == 0: 
-                if len(current_page) != 0:
-                    pages.append(current_page)
-                current_page = []
-            if i not in self.render_dicts:
-                self.render_dicts[i] = self.get_render_dict(competitor)
-            current_page.append(self.render_dicts[i])
-        if len(current_page) != 0:
-            while len(current_page) != self.per_page:
-                if -1 not in self.render_dicts:
-                    self.render_dicts[-1] = self.get_render_dict(Competitor(-1, "2042DUMM00", "No Name", "Germany", "de", 0, [], []))
-                current_page.append(self.render_dicts[-1])
-            pages.append(current_page)
-        self.pages = pages
+        self.pages = self.paginate(self.records(range(len(competitors))))
                 
         self.event_index = {event: i for i, event in enumerate(self.events)}
         self.event_times = OrderedDict(sorted(competitors.event_times.items(), key=lambda x: (self.event_index[x[0][0]], x[0][1])))
         self.event_r1_times = OrderedDict(sorted([(event, t) for (event, round), t in competitors.event_times.items() if round == 1], key=lambda x: self.event_index[x[0]]))
-        self.template = self.jinja.get_template(self.template_path.name)
+        with stage("load_template", desc=self.template_path.name):
+            self.template = self.jinja.get_template(self.template_path.name)
 
-    def render(self, tag_width=None, tag_height=None):
-        if tag_width != None or tag_height != None and (tag_width != self.tag_width or tag_height != self.tag_height):
-            self.tag_width = tag_width if tag_width else self.tag_width
-            self.tag_height = tag_height if tag_height else self.tag_height
+    def records(self, rows) -> list[RenderRecord]:
+        # render dicts of the given rows of self.competitors, only the missing ones are built
+        missing = [i for i in dict.fromkeys(rows) if i not in self.render_dicts]
+        if missing:
+            self.render_dicts.update(zip(missing, self.get_render_dicts(self.competitors, missing)))
+        return [self.render_dicts[i] for i in rows]
+
+    def paginate(self, records: list[RenderRecord]) -> list[list[RenderRecord]]:
+        # the last page is filled up with the dummy competitor
+        pages = [records[i:i + self.per_page] for i in range(0, len(records), self.per_page)]
+        if pages and len(pages[-1]) != self.per_page:
+            if -1 not in self.render_dicts:
+                self.render_dicts[-1] = self.get_render_dict(Competitor(-1, "2042DUMM00", "No Name", "Germany", "de", 0, [], []))
+            pages[-1] += [self.render_dicts[-1]] * (self.per_page - len(pages[-1]))
+        return pages
+
+    def reprint(self, rows: list[int], tag_width=None, tag_height=None):
+        # renders only the tags of the given rows of the competitors passed to setup, e.g. for lost badges
+        # the other competitors keep their render dicts and qr codes
+        with self.lock:
+            self.resize(tag_width, tag_height)
+            with stage("reprint", competitors=len(rows)):
+                pages = self.paginate(self.records(rows))
+            return self.render_pages(pages)
+
+    def template_fingerprint(self):
+        # hash of the template and every template it includes, extends or imports
+        digest = hashlib.sha256()
+        todo = [self.template_path.name]
+        seen = set()
+        while todo:
+            name = todo.pop()
+            if name in seen:
+                continue
+            seen.add(name)
+            source, _, _ = self.jinja.loader.get_source(self.jinja, name)
+            source_hash = hashlib.sha256(source.encode("utf-8")).hexdigest()
+            cached_hash, references = self.template_references.get(name, (None, None))
+            if cached_hash != source_hash:
+                # only parse templates that changed, dynamic references (None) can't be followed
+                import jinja2.meta
+                references = [ref for ref in jinja2.meta.find_referenced_templates(self.jinja.parse(source)) if ref]
+                self.template_references[name] = (source_hash, references)
+            digest.update(f"{name}\0{source_hash}\0".encode("utf-8"))
+            todo.extend(references)
+        return digest.hexdigest()
+
+    def resize(self, tag_width=None, tag_height=None):
+        tag_width = tag_width if tag_width else self.tag_width
+        tag_height = tag_height if tag_height else self.tag_height
+        if tag_width != self.tag_width or tag_height != self.tag_height:
+            self.tag_width = tag_width
+            self.tag_height = tag_height
             self.setup(self.competitors)
-        self.template = self.jinja.get_template(self.template_path.name)
-        data_dict = dict(
+
+    # pages can be a subset of self.pages to only render those
+    def get_data_dict(self, tag_width=None, tag_height=None, pages=None):
+        self.resize(tag_width, tag_height)
+        with stage("load_template", desc=self.template_path.name):
+            # checks whether the template changed on disk and recompiles it if it did
+            self.template = self.jinja.get_template(self.template_path.name)
+        pages = self.pages if pages is None else pages
+        assets = self.assets
+        if assets.self_contained:
+            with stage("assets"):
+                assets.fingerprint()
+                assets = assets.use(
+                    events={event for event, _ in self.event_times} | {assignment.event for page in pages for competitor in page for assignment in competitor["assignments"]},
+                    flags={competitor["iso2"] for page in pages for competitor in page},
+                )
+        # the dict together with self.template is all a render needs, so it can go on after the lock is released
+        return dict(
+            **assets.helpers(),
             comp_name=self.comp_name,
             comp_id=self.comp_id,
-            pages=self.pages, 
+            pages=pages, 
             wca_events=self.events, 
             event_times=self.event_times, 
             event_r1_times=self.event_r1_times,
@@ -182,13 +489,68 @@ class JinjaRenderer:
             page_width=self.page_width,
             page_height=self.page_height,
         )
-        return self.template.render(**data_dict)
+
+    def render(self, tag_width=None, tag_height=None):
+        with self.lock:
+            data_dict = self.get_data_dict(tag_width, tag_height)
+            template = self.template
+        with stage("render", pages=len(data_dict["pages"])) as counts:
+            html = template.render(**data_dict)
+            if active():
+                counts["bytes"] = len(html.encode("utf-8"))
+        return html
+
+    def render_pages(self, pages, tag_width=None, tag_height=None):
+        with self.lock:
+            data_dict = self.get_data_dict(tag_width, tag_height, pages)
+            template = self.template
+        with stage("render", pages=len(pages)) as counts:
+            html = template.render(**data_dict)
+            if active():
+                counts["bytes"] = len(html.encode("utf-8"))
+        return html
+
+    def render_stream(self, tag_width=None, tag_height=None):
+        # everything that can fail happens here, before the first chunk is sent
+        with self.lock:
+            data_dict = self.get_data_dict(tag_width, tag_height)
+            cursor = PageCursor(data_dict["pages"])
+            data_dict["pages"] = cursor
+            return self._stream(self.template.generate(**data_dict), cursor)
+
+    @staticmethod
+    def _stream(chunks, cursor):
+        # jinja yields many tiny chunks, join them and yield once every time the template moves on to the next page
+        # the stage includes the time the consumer spends on each chunk, e.g. writing it to a file
+        with stage("render_stream", pages=len(cursor)) as counts:
+            buffer = []
+            position = cursor.position
+            measure = active()
+            size = 0
+            for chunk in chunks:
+                if cursor.position != position:
+                    position = cursor.position
+                    if buffer:
+                        page = "".join(buffer)
+                        if measure:
+                            size += len(page.encode("utf-8"))
+                        yield page
+                        buffer = []
+                buffer.append(chunk)
+            if buffer:
+                page = "".join(buffer)
+                if measure:
+                    size += len(page.encode("utf-8"))
+                yield page
+            if measure:
+                counts["bytes"] = size
 
     def render_file(self, competitors: CompetitorData, out_path) -> str:
         self.setup(competitors)
-        rendered = self.render()
         with open(out_path, "w", encoding="utf8") as file:
-            file.write(rendered)
+            for chunk in self.render_stream():
+                file.write(chunk)
+                file.flush()
             
 
     def competition_count_to_emoji(self, comp_count):
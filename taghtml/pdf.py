@@ -0,0 +1,66 @@
+import os
+import tempfile
+import multiprocessing
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+# weasyprint and pypdf are optional dependencies, install them with `pip install taghtml[pdf]`
+
+
+def check_dependencies():
+    try:
+        import weasyprint
+        import pypdf
+    except (ImportError, OSError) as e:
+        raise ImportError(f"PDF output needs weasyprint and pypdf, install them with `pip install taghtml[pdf]`. ({e})") from e
+
+
+def html_to_pdf(html: str, base_url: str, out_path: Path) -> Path:
+    from weasyprint import HTML, URLFetcher
+    # the pdf is rendered without network access, remote resources like web fonts are skipped
+    url_fetcher = URLFetcher(allowed_protocols={"file", "data"})
+    HTML(string=html, base_url=base_url, url_fetcher=url_fetcher).write_pdf(out_path)
+    return out_path
+
+
+def merge_pdfs(paths: list[Path], out_path: Path):
+    from pypdf import PdfWriter
+    writer = PdfWriter()
+    for path in paths:
+        writer.append(path)
+    with open(out_path, "wb") as file:
+        writer.write(file)
+
+
+def render_pdf(r, competitors, out_path: Path, pages_per_chunk=8, jobs=None, progress=None):
+    # every entry of r.pages becomes a front and a back page, chunks only ever contain whole entries
+    # so the duplex pairing stays intact when the chunks are merged back together
+    check_dependencies()
+    r.setup(competitors)
+    chunks = [r.pages[i:i + pages_per_chunk] for i in range(0, len(r.pages), pages_per_chunk)]
+    jobs = min(jobs or os.cpu_count() or 1, max(len(chunks), 1))
+    base_url = Path.cwd().as_uri() + "/"
+    task = progress.add_task("Rendering to PDF.", total=len(chunks)) if progress else None
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = [Path(tmp) / f"{i:05d}.pdf" for i in range(len(chunks))]
+        if jobs == 1:
+            for chunk, path in zip(chunks, paths):
+                html_to_pdf(r.render_pages(chunk), base_url, path)
+                if progress:
+                    progress.update(task, advance=1)
+        else:
+            # spawned workers don't inherit the competition data of this process and the html of a chunk
+            # is only rendered shortly before a worker is free to take it, both keep the memory bounded
+            with ProcessPoolExecutor(jobs, mp_context=multiprocessing.get_context("spawn")) as pool:
+                pending = []
+                for chunk, path in zip(chunks, paths):
+                    if len(pending) >= 2 * jobs:
+                        pending.pop(0).result()
+                        if progress:
+                            progress.update(task, advance=1)
+                    pending.append(pool.submit(html_to_pdf, r.render_pages(chunk), base_url, path))
+                for future in pending:
+                    future.result()
+                    if progress:
+                        progress.update(task, advance=1)
+        merge_pdfs(paths, out_path)
@@ -0,0 +1,302 @@
+import asyncio
+import hashlib
+import itertools
+import threading
+import time
+import traceback
+import fastapi
+import requests
+from collections import OrderedDict
+from concurrent.futures import Future
+from pathlib import Path
+from fastapi.staticfiles import StaticFiles
+from .datahandler import CompetitorData, load_comp_counts, load_countries, _WCIF_TTL_
+from .jinjarenderer import JinjaRenderer, create_environment
+from .timing import record, stage
+
+
+class RenderCache:
+    # bounded LRU of rendered documents keyed by everything the output depends on
+    def __init__(self, renderer: JinjaRenderer, size=8) -> None:
+        self.renderer = renderer
+        self.size = size
+        self.entries: OrderedDict[str, str] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def key(self, tag_width=None, tag_height=None) -> str:
+        r = self.renderer
+        key = (
+            r.template_fingerprint(),
+            tag_width or r.tag_width,
+            tag_height or r.tag_height,
+            r.page_width,
+            r.page_height,
+            r.data_version,
+            r.assets.fingerprint(),
+        )
+        return '"' + hashlib.sha256(repr(key).encode("utf-8")).hexdigest()[:32] + '"'
+
+    def get(self, key: str) -> str | None:
+        with self.lock:
+            if key not in self.entries:
+                return None
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def put(self, key: str, body: str):
+        with self.lock:
+            self.entries[key] = body
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def stream(self, key: str, chunks):
+        # passes the chunks through and keeps the document once it was sent completely
+        parts = []
+        for chunk in chunks:
+            parts.append(chunk)
+            yield chunk
+        self.put(key, "".join(parts))
+
+
+class Watcher(threading.Thread):
+    # polls the files the preview depends on and decides how much work a change needs
+    def __init__(self, renderer: JinjaRenderer, interval=0.5) -> None:
+        super().__init__(daemon=True)
+        self.renderer = renderer
+        self.interval = interval
+        self.version = 0 # bumped after every change, connected browsers reload when it moves
+        self.mtimes = self.scan()
+
+    def watched(self):
+        r = self.renderer
+        emojis = [Path(r.exp_emoji_path), Path(r.people_emoji_path), Path(r.cid_modulo_emoji_path)]
+        yield from (("emoji", path) for path in emojis)
+        yield from (("template", path) for path in Path(r.template_path).parent.rglob("*") if path.is_file())
+        yield from (("asset", path) for path in Path("styles").rglob("*") if path.is_file())
+        yield from (("asset", path) for path in Path("graphics").rglob("*") if path.is_file())
+
+    def scan(self):
+        mtimes = {}
+        for kind, path in self.watched():
+            try:
+                mtimes[path] = (kind, path.stat().st_mtime_ns)
+            except FileNotFoundError:
+                pass
+        return mtimes
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            # a half written or broken file must not end the thread, the next save gets picked up again
+            try:
+                self.check()
+            except Exception:
+                traceback.print_exc()
+
+    def check(self):
+        mtimes = self.scan()
+        changed = {kind for path, (kind, mtime) in mtimes.items() if self.mtimes.get(path) != (kind, mtime)}
+        changed |= {kind for path, (kind, _) in self.mtimes.items() if path not in mtimes}
+        self.mtimes = mtimes
+        if not changed:
+            return
+        try:
+            if "emoji" in changed:
+                self.renderer.reload_emojis()
+        finally:
+            # template changes show up in the template fingerprint and stylesheets or graphics are either
+            # fetched by the browser itself or inlined and part of the assets fingerprint, so all only need a reload
+            self.version += 1
+
+
+class Competitions:
+    # bounded LRU of prepared competitions, each with its own renderer and render cache
+    def __init__(self, renderer_kwargs: dict, size=8, cache_size=8, offline=False, wcif_ttl=_WCIF_TTL_) -> None:
+        self.renderer_kwargs = renderer_kwargs
+        self.size = size
+        self.cache_size = cache_size
+        self.offline = offline
+        self.wcif_ttl = wcif_ttl
+        self.entries: OrderedDict[str, tuple[JinjaRenderer, RenderCache]] = OrderedDict()
+        self.loading: dict[str, Future] = {}
+        self.lock = threading.Lock()
+        # every competition shares the export tables and the compiled templates
+        self.comp_counts = load_comp_counts()
+        self.countries = load_countries()
+        self.jinja = create_environment(Path(renderer_kwargs["template_path"]))
+
+    def load(self, comp_id: str) -> tuple[JinjaRenderer, RenderCache]:
+        comp_data = CompetitorData(comp_id, self.offline, comp_counts=self.comp_counts, countries=self.countries, wcif_ttl=self.wcif_ttl)
+        r = JinjaRenderer(**self.renderer_kwargs, jinja=self.jinja)
+        r.setup(comp_data)
+        return r, RenderCache(r, self.cache_size)
+
+    def get(self, comp_id: str) -> tuple[JinjaRenderer, RenderCache]:
+        with self.lock:
+            if comp_id in self.entries:
+                self.entries.move_to_end(comp_id)
+                return self.entries[comp_id]
+            # the first request loads the competition, everyone asking for it meanwhile waits for that load
+            future = self.loading.get(comp_id)
+            loader = future is None
+            if loader:
+                future = self.loading[comp_id] = Future()
+        if not loader:
+            with stage("wait_for_load", desc=comp_id):
+                return future.result()
+        try:
+            with stage("load_competition", desc=comp_id):
+                entry = self.load(comp_id)
+        except BaseException as e:
+            # failed loads aren't kept, the next request tries again
+            with self.lock:
+                del self.loading[comp_id]
+            future.set_exception(e)
+            raise
+        with self.lock:
+            del self.loading[comp_id]
+            self.entries[comp_id] = entry
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+        future.set_result(entry)
+        return entry
+
+
+def reload_script(version: int) -> str:
+    return f"""<script>new EventSource("/events?since={version}").addEventListener("reload", () => location.reload());</script>"""
+
+
+def create_app(r: JinjaRenderer, cache_size=8, watch=False) -> fastapi.FastAPI:
+    server = fastapi.FastAPI()
+    cache = RenderCache(r, cache_size)
+    watcher = None
+    if watch:
+        watcher = Watcher(r)
+        watcher.start()
+
+        @server.get("/events")
+        async def events(request: fastapi.Request, since: int = 0):
+            async def stream():
+                while not await request.is_disconnected():
+                    if watcher.version != since:
+                        yield f"event: reload\ndata: {watcher.version}\n\n"
+                        return
+                    await asyncio.sleep(0.25)
+            return fastapi.responses.StreamingResponse(stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+    @server.get("/")
+    def render(request: fastapi.Request, tag_width: float | None = None, tag_height: float | None = None):
+        # Server-Timing shows up in the network tab of the browser, streamed responses only
+        # include the work done before the first byte since the headers are sent at that point
+        with record() as timings:
+            with stage("total"):
+                response = render_response(r, cache, request, tag_width, tag_height, watcher)
+        response.headers["Server-Timing"] = timings.server_timing()
+        return response
+
+    @server.get("/reprint")
+    def reprint(ids: str, tag_width: float | None = None, tag_height: float | None = None):
+        with record() as timings:
+            with stage("total"):
+                response = reprint_response(r, ids, tag_width, tag_height)
+        response.headers["Server-Timing"] = timings.server_timing()
+        return response
+
+    server.mount("/styles", StaticFiles(directory="styles", html=True), name="styles")
+    server.mount("/graphics", StaticFiles(directory="graphics", html=True), name="graphics")
+    return server
+
+
+def create_serve_app(competitions: Competitions) -> fastapi.FastAPI:
+    server = fastapi.FastAPI()
+
+    @server.get("/")
+    def index():
+        with competitions.lock:
+            loaded = list(reversed(competitions.entries))
+        return {"loaded": loaded, "size": competitions.size}
+
+    def get(comp_id: str) -> tuple[JinjaRenderer, RenderCache]:
+        try:
+            return competitions.get(comp_id)
+        except requests.HTTPError as e:
+            status = e.response.status_code if e.response is not None else 502
+            raise fastapi.HTTPException(404 if status == 404 else 502, f"Could not load {comp_id}: {e}")
+        except FileNotFoundError as e:
+            raise fastapi.HTTPException(404, str(e))
+
+    @server.get("/c/{comp_id}/")
+    def render(request: fastapi.Request, comp_id: str, tag_width: float | None = None, tag_height: float | None = None):
+        with record() as timings:
+            with stage("total"):
+                r, cache = get(comp_id)
+                response = render_response(r, cache, request, tag_width, tag_height)
+        response.headers["Server-Timing"] = timings.server_timing()
+        return response
+
+    @server.get("/c/{comp_id}/reprint")
+    def reprint(comp_id: str, ids: str, tag_width: float | None = None, tag_height: float | None = None):
+        with record() as timings:
+            with stage("total"):
+                r, _ = get(comp_id)
+                response = reprint_response(r, ids, tag_width, tag_height)
+        response.headers["Server-Timing"] = timings.server_timing()
+        return response
+
+    # the templates link the styles and graphics relative to the page
+    for prefix in ("", "/c/{comp_id}"):
+        server.mount(f"{prefix}/styles", StaticFiles(directory="styles", html=True))
+        server.mount(f"{prefix}/graphics", StaticFiles(directory="graphics", html=True))
+    return server
+
+
+def reprint_response(r: JinjaRenderer, ids: str, tag_width: float | None, tag_height: float | None):
+    # ids is a comma separated list of registrantIds, WCA IDs or name prefixes, a prefix can match several competitors
+    rows = []
+    unknown = []
+    with stage("find"):
+        for query in ids.split(","):
+            found = r.competitors.find(query)
+            if query.strip() and not found:
+                unknown.append(query.strip())
+            rows.extend(found)
+    if unknown:
+        raise fastapi.HTTPException(404, f"No competitor found for {', '.join(unknown)}.")
+    if not rows:
+        raise fastapi.HTTPException(400, "No competitors given.")
+    # reprints are cheap and always wanted fresh, so they skip the render cache
+    html = r.reprint(list(dict.fromkeys(rows)), tag_width, tag_height)
+    return fastapi.responses.HTMLResponse(html, headers={"Cache-Control": "no-store"})
+
+
+def render_response(r: JinjaRenderer, cache: RenderCache, request: fastapi.Request, tag_width: float | None, tag_height: float | None, watcher: Watcher | None = None):
+    # the renderer is shared by all request threads, the key and the document rendered for it
+    # have to come from the same state, so both happen under its lock and the render goes on from a snapshot
+    with r.lock:
+        with stage("fingerprint"):
+            key = cache.key(tag_width, tag_height)
+        etag = key
+        if watcher is not None:
+            # the reload script carries the watcher version, so it is part of the etag but not of the cache key,
+            # that way a change to a stylesheet or a graphic doesn't cause a re-render
+            etag = f'{key[:-1]}-{watcher.version}"'
+        # no-cache makes the browser revalidate on every reload, which is answered with a 304 if nothing changed
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if etag in [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]:
+            with stage("cache", desc="not modified"):
+                # the browser shows the document of this size, so it stays sticky just like after a render
+                r.resize(tag_width, tag_height)
+                return fastapi.Response(status_code=304, headers=headers)
+        script = reload_script(watcher.version) if watcher is not None else ""
+        body = cache.get(key)
+        if body is not None:
+            with stage("cache", desc="hit"):
+                # keep the size sticky for the next reload without parameters, just like a fresh render would
+                r.resize(tag_width, tag_height)
+                return fastapi.responses.HTMLResponse(body + script, headers=headers)
+        with stage("cache", desc="miss"):
+            chunks = cache.stream(key, r.render_stream(tag_width, tag_height))
+    if script:
+        chunks = itertools.chain(chunks, [script])
+    return fastapi.responses.StreamingResponse(chunks, media_type="text/html", headers=headers)
@@ -0,0 +1,92 @@
+import re
+import time
+import json
+import contextlib
+import contextvars
+from dataclasses import dataclass, asdict
+
+# the timings of the run in the current context, stages outside of record() cost next to nothing
+_current = contextvars.ContextVar("taghtml_timings", default=None)
+
+
+@dataclass
+class Stage:
+    name: str
+    seconds: float
+    depth: int # how many stages this one is nested in
+    counts: dict
+
+
+class Timings:
+    # the stages of one run in the order they finished, listener is called with the name of every stage that starts
+    def __init__(self, listener=None) -> None:
+        self.stages: list[Stage] = []
+        self.listener = listener
+        self.depth = 0
+
+    def summary(self) -> dict[str, dict]:
+        # stages that ran several times are added up, counts as well
+        summary = {}
+        for s in self.stages:
+            entry = summary.setdefault(s.name, {"calls": 0, "seconds": 0.0, "counts": {}})
+            entry["calls"] += 1
+            entry["seconds"] += s.seconds
+            for key, value in s.counts.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    entry["counts"][key] = entry["counts"].get(key, 0) + value
+                else:
+                    entry["counts"][key] = value
+        return summary
+
+    def to_json(self) -> str:
+        return json.dumps({"stages": [asdict(s) for s in self.stages], "summary": self.summary()}, indent=2, default=str)
+
+    def server_timing(self) -> str:
+        # metric names have to be http tokens, the stages are listed in the order they finished
+        return ", ".join(
+            f"{re.sub(r'[^A-Za-z0-9_-]', '_', s.name)};dur={s.seconds * 1000:.1f}" + (f';desc="{s.counts["desc"]}"' if "desc" in s.counts else "")
+            for s in self.stages
+        )
+
+    def table(self):
+        from rich.table import Table
+        table = Table("Stage", "Seconds", "Counts")
+        for s in self.stages:
+            counts = ", ".join(f"{key}={value}" for key, value in s.counts.items())
+            table.add_row("  " * s.depth + s.name, f"{s.seconds:.4f}", counts)
+        return table
+
+
+def active() -> bool:
+    # counts that take real work to compute, e.g. encoding a whole document, are only worth it while recording
+    return _current.get() is not None
+
+
+@contextlib.contextmanager
+def record(timings: Timings | None = None):
+    # every stage inside the block ends up in timings
+    timings = timings or Timings()
+    token = _current.set(timings)
+    try:
+        yield timings
+    finally:
+        _current.reset(token)
+
+
+@contextlib.contextmanager
+def stage(name: str, **counts):
+    # yields the counts of the stage so they can be filled in once they are known
+    timings = _current.get()
+    if timings is None:
+        yield counts
+        return
+    if timings.listener:
+        timings.listener(name)
+    depth = timings.depth
+    timings.depth += 1
+    start = time.perf_counter()
+    try:
+        yield counts
+    finally:
+        timings.depth = depth
+        timings.stages.append(Stage(name, time.perf_counter() - start, depth, counts))
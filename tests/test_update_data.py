@@ -0,0 +1,155 @@
+import io
+import json
+import threading
+import zipfile
+import pytest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from taghtml import datahandler
+
+__ETAG__ = '"export-1"'
+
+
+def make_export() -> bytes:
+    # a tiny export with the two tables update_data extracts, in a subfolder like some mirrors ship it
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as file:
+        file.writestr("export/WCA_export_Results.tsv", "personId\tcompetitionId\n2020AAAA01\tA2020\n2020AAAA01\tB2021\n2021BBBB01\tA2020\n")
+        file.writestr("export/WCA_export_Countries.tsv", "id\tname\tiso2\nGermany\tGermany\tDE\n")
+        file.writestr("export/WCA_export_Persons.tsv", "id\tname\n")
+    return buffer.getvalue()
+
+
+class ExportHandler(BaseHTTPRequestHandler):
+    # serves server.body like the WCA website does, with etags and byte ranges
+    def do_GET(self):
+        server = self.server
+        server.requests.append(dict(self.headers))
+        body = server.body
+        if self.headers.get("If-None-Match") == server.etag:
+            self.send_response(304)
+            self.send_header("ETag", server.etag)
+            self.end_headers()
+            return
+        range_header = self.headers.get("Range")
+        if_range = self.headers.get("If-Range")
+        if range_header and (if_range is None or if_range == server.etag):
+            start = int(range_header.removeprefix("bytes=").split("-")[0])
+            if start >= len(body):
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{len(body)}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{len(body) - 1}/{len(body)}")
+            body = body[start:]
+        else:
+            self.send_response(200)
+        self.send_header("ETag", server.etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), ExportHandler)
+    httpd.body = make_export()
+    httpd.etag = __ETAG__
+    httpd.requests = []
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def data(tmp_path, monkeypatch):
+    # the paths are derived from _DATA_ at import time, so all of them are pointed to the temporary folder
+    monkeypatch.setattr(datahandler, "_DATA_", tmp_path)
+    monkeypatch.setattr(datahandler, "_EXPORT_ZIP_", tmp_path / "export.zip")
+    monkeypatch.setattr(datahandler, "_EXPORT_META_", tmp_path / "export.json")
+    monkeypatch.setattr(datahandler, "_COMP_COUNTS_", tmp_path / "comp_counts.parquet")
+    monkeypatch.setattr(datahandler, "_COMP_COUNTS_STAMP_", tmp_path / "comp_counts.json")
+    return tmp_path
+
+
+def url(server) -> str:
+    return f"http://127.0.0.1:{server.server_port}/WCA_export.tsv.zip"
+
+
+def partial(data):
+    return data / "export.zip.part"
+
+
+def meta(data) -> dict:
+    return json.loads((data / "export.json").read_text(encoding="utf8"))
+
+
+def assert_extracted(data, server):
+    assert (data / "export.zip").read_bytes() == server.body
+    assert not partial(data).exists()
+    assert meta(data) == {"etag": __ETAG__, "last_modified": None}
+    assert (data / "WCA_export_Results.tsv").is_file()
+    assert (data / "WCA_export_Countries.tsv").is_file()
+    assert not (data / "WCA_export_Persons.tsv").exists()
+    assert datahandler.comp_counts_current()
+    counts = dict(datahandler.load_comp_counts().iter_rows())
+    assert counts == {"2020AAAA01": 2, "2021BBBB01": 1}
+
+
+def test_full_download(server, data):
+    datahandler.update_data(url(server))
+    assert len(server.requests) == 1
+    assert "Range" not in server.requests[0]
+    assert "If-None-Match" not in server.requests[0]
+    assert_extracted(data, server)
+
+
+def test_not_modified(server, data):
+    datahandler.update_data(url(server))
+    stamp = (data / "comp_counts.json").read_text(encoding="utf8")
+    zip_mtime = (data / "export.zip").stat().st_mtime_ns
+    datahandler.update_data(url(server))
+    assert len(server.requests) == 2
+    assert server.requests[1]["If-None-Match"] == __ETAG__
+    # a 304 neither downloads, extracts nor indexes anything again
+    assert (data / "export.zip").stat().st_mtime_ns == zip_mtime
+    assert (data / "comp_counts.json").read_text(encoding="utf8") == stamp
+    assert_extracted(data, server)
+
+
+def test_resume(server, data):
+    half = len(server.body) // 2
+    partial(data).write_bytes(server.body[:half])
+    (data / "export.json").write_text(json.dumps({"partial": {"etag": __ETAG__, "last_modified": None}}), encoding="utf8")
+    datahandler.update_data(url(server))
+    assert len(server.requests) == 1
+    assert server.requests[0]["Range"] == f"bytes={half}-"
+    assert server.requests[0]["If-Range"] == __ETAG__
+    assert_extracted(data, server)
+
+
+def test_resume_changed_export(server, data):
+    # If-Range doesn't match anymore, so the server sends the whole new export and the partial file is replaced
+    partial(data).write_bytes(b"x" * 100)
+    (data / "export.json").write_text(json.dumps({"partial": {"etag": '"export-0"', "last_modified": None}}), encoding="utf8")
+    datahandler.update_data(url(server))
+    assert len(server.requests) == 1
+    assert server.requests[0]["If-Range"] == '"export-0"'
+    assert_extracted(data, server)
+
+
+def test_range_not_satisfiable(server, data):
+    partial(data).write_bytes(server.body + b"garbage")
+    (data / "export.json").write_text(json.dumps({"partial": {"etag": __ETAG__, "last_modified": None}}), encoding="utf8")
+    datahandler.update_data(url(server))
+    # the 416 throws the partial file away and the download starts over without a range
+    assert len(server.requests) == 2
+    assert server.requests[0]["Range"] == f"bytes={len(server.body) + 7}-"
+    assert "Range" not in server.requests[1]
+    assert_extracted(data, server)